@@ -0,0 +1,133 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+import asyncpg
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from dotenv import load_dotenv, find_dotenv
+
+from metrics import RESPONSE_CACHE_REQUESTS
+from replicas import DATABASE_REPLICA_CHECK_INTERVAL, DATABASE_REPLICA_MAX_LAG
+
+load_dotenv(find_dotenv())
+
+SYNC_CHANNEL = 'kanban_sync'
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# A healthy replica may still miss the sync that bumped the generation for up to its allowed lag
+# plus one health check interval; responses built in that window are read from the primary
+PRIMARY_READ_WINDOW = DATABASE_REPLICA_MAX_LAG + DATABASE_REPLICA_CHECK_INTERVAL
+
+
+class CacheEntry:
+    __slots__ = ('body', 'media_type', 'etag', 'generation', 'expires_at')
+
+    def __init__(self, body, media_type, generation):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.generation = generation
+        self.expires_at = time.monotonic() + RESPONSE_CACHE_TTL
+
+    def to_response(self, request):
+        headers = {'ETag': self.etag, 'Cache-Control': 'no-cache'}
+        if self.etag in parse_if_none_match(request.headers.get('if-none-match')):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+
+def parse_if_none_match(value):
+    if not value:
+        return set()
+    return {tag.strip() for tag in value.split(',')}
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.generation = 0
+        self.generation_changed_at = None
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.generation != self.generation or entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, entry):
+        if key in self._entries:
+            self._remove(key)
+        if len(entry.body) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.body)
+
+    def set_generation(self, generation):
+        if generation != self.generation:
+            self.generation = generation
+            self.generation_changed_at = time.monotonic()
+            self._entries.clear()
+            self.size = 0
+
+    def reads_primary(self):
+        return (
+            self.generation_changed_at is not None
+            and time.monotonic() - self.generation_changed_at < PRIMARY_READ_WINDOW
+        )
+
+    def on_notify(self, payload):
+        self.set_generation(int(payload))
+
+    async def load_generation(self, connection):
+        try:
+            generation = await connection.fetchval("SELECT generation FROM sync_generation WHERE id = 1")
+        except asyncpg.UndefinedTableError:
+            generation = None
+        self.set_generation(generation or 0)
+
+
+class CachedRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def cached_handler(request: Request) -> Response:
+            cache = request.app.state.response_cache
+            body = await request.body()
+            # The token is part of the key, so a cached response is only served to
+            # requests carrying the same credentials that passed authentication
+            key = (
+                request.method,
+                request.url.path,
+                tuple(sorted(request.query_params.multi_items())),
+                request.headers.get('authorization'),
+                hashlib.blake2b(body, digest_size=16).digest() if body else None,
+            )
+            entry = cache.get(key)
+            RESPONSE_CACHE_REQUESTS.labels('miss' if entry is None else 'hit').inc()
+            if entry is None:
+                generation = cache.generation
+                # Otherwise a lagging replica's pre-sync data would be cached as the new generation
+                request.state.read_primary = cache.reads_primary()
+                response = await handler(request)
+                if response.status_code != 200 or not hasattr(response, 'body'):
+                    return response
+                entry = CacheEntry(response.body, response.media_type, generation)
+                if generation == cache.generation:
+                    cache.set(key, entry)
+            return entry.to_response(request)
+
+        return cached_handler
@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+import asyncpg
+import orjson
+
+from databases import AsyncDatabase
+
+CHANGES_CHANNEL = 'kanban_changes'
+CHANGES_BATCH_SIZE = 1000
+CHANGES_KEEPALIVE = float(os.getenv('CHANGES_KEEPALIVE', 15))
+
+
+class ChangeFeed:
+    # Tracks the latest change_events seq announced by the parser and wakes waiting streams
+    def __init__(self):
+        self.last_seq = 0
+        self._waiters = set()
+
+    def set_last_seq(self, seq):
+        if seq > self.last_seq:
+            self.last_seq = seq
+            for waiter in self._waiters:
+                waiter.set()
+
+    def on_notify(self, payload):
+        self.set_last_seq(int(payload))
+
+    async def load_last_seq(self, connection):
+        try:
+            seq = await connection.fetchval("SELECT max(seq) FROM change_events")
+        except asyncpg.UndefinedTableError:
+            seq = None
+        self.set_last_seq(seq or 0)
+
+    async def wait(self, after, timeout):
+        # True when events after `after` may be available, False on timeout
+        if self.last_seq > after:
+            return True
+        waiter = asyncio.Event()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiters.discard(waiter)
+
+
+def format_event(event, name, data):
+    lines = [f"event: {name}", f"data: {orjson.dumps(data).decode()}"]
+    if event is not None:
+        lines.insert(0, f"id: {event}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+async def stream_changes(engine, feed, after):
+    # A session is opened per read, so an idle stream does not hold a pooled connection
+    async with AsyncDatabase(engine) as db:
+        first_seq, last_seq = await db.get_change_log_bounds()
+    if after is None:
+        after = last_seq or 0
+    elif first_seq is not None and after < first_seq - 1:
+        # Events after `after` were trimmed from the log, the client has to re-read the data
+        yield format_event(last_seq, 'reset', {'seq': last_seq})
+        after = last_seq
+
+    # The parser holds an advisory lock from inserting events until commit, so seq follows commit order
+    # and an event with a smaller seq never becomes visible after `after` has moved past it
+    while True:
+        async with AsyncDatabase(engine) as db:
+            events = await db.get_change_events(after, CHANGES_BATCH_SIZE)
+        for event in events:
+            yield format_event(event.seq, event.action, event._asdict())
+        if events:
+            after = events[-1].seq
+            if len(events) == CHANGES_BATCH_SIZE:
+                continue
+        if not await feed.wait(after, CHANGES_KEEPALIVE):
+            yield b": keepalive\n\n"
@@ -1,8 +1,14 @@
 import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, backref, joinedload
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Table, select
+from sqlalchemy.orm import sessionmaker, relationship, backref, foreign, selectinload, aliased
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, ForeignKey, Date, DateTime, Table, Index, select, text, literal, any_,
+    bindparam, case, func, literal_column, null, union_all, and_, or_, DDL, event
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, array
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
 
 from dotenv import load_dotenv, find_dotenv
 
@@ -11,8 +17,9 @@ load_dotenv(find_dotenv())
 Base = declarative_base()
 
 project_members = Table('project_members', Base.metadata,
-    Column('project_id', String, ForeignKey('projects.id')),
-    Column('service_user_id', String, ForeignKey('service_identities.service_user_id'))
+    Column('project_id', String, ForeignKey('projects.id'), primary_key=True),
+    Column('service_user_id', String, ForeignKey('service_identities.service_user_id'), primary_key=True),
+    Index('ix_project_members_service_user_id', 'service_user_id')
 )
 
 class Project(Base):
@@ -24,7 +31,7 @@ class Project(Base):
 class ServiceIdentity(Base):
     __tablename__ = 'service_identities'
     service_user_id = Column(String, primary_key=True)
-    employee_email = Column(String, ForeignKey('employees.email'))
+    employee_email = Column(String, ForeignKey('employees.email'), index=True)
     service_name = Column(String)
     projects = relationship('Project', secondary=project_members, back_populates="members")
     employee = relationship("Employee", back_populates="service_identities")
@@ -40,64 +47,181 @@ class Employee(Base):
 
 
 
+# Partitioned by status: tasks_active holds 'Active' tasks, tasks_archive everything else.
+# The partition key has to be part of the primary key, so there is no parent_task_id foreign key.
 class Task(Base):
     __tablename__ = 'tasks'
     id = Column(String, primary_key=True)
     assigned_employee_id = Column(String, ForeignKey('service_identities.service_user_id'))
-    parent_task_id = Column(String, ForeignKey('tasks.id'), nullable=True)
+    parent_task_id = Column(String, nullable=True)
     name = Column(String)
-    status = Column(String)
+    status = Column(String, primary_key=True)
     start_date = Column(Date, nullable=True)
     end_date = Column(Date, nullable=True)
     deadline = Column(Date, nullable=True)
 
     assigned_service_identity = relationship("ServiceIdentity", back_populates="tasks")
-    subtasks = relationship("Task", backref=backref('parent', remote_side=[id]))
+    subtasks = relationship(
+        "Task", primaryjoin=lambda: Task.id == foreign(Task.parent_task_id),
+        backref=backref('parent', remote_side=lambda: [Task.id])
+    )
+
+    __table_args__ = (
+        Index('ix_tasks_status_id', 'status', 'id'),
+        Index('ix_tasks_assigned_employee_id_id', 'assigned_employee_id', 'id'),
+        Index('ix_tasks_parent_task_id_id', 'parent_task_id', 'id'),
+        Index('ix_tasks_deadline', 'deadline'),
+        Index('ix_tasks_start_date', 'start_date'),
+        Index('ix_tasks_active_deadline', 'deadline', postgresql_where=text("status = 'Active'")),
+        Index('ix_tasks_root_id', 'id', postgresql_where=text("parent_task_id IS NULL")),
+        {'postgresql_partition_by': 'LIST (status)'},
+    )
+
+
+event.listen(Task.__table__, 'after_create', DDL(
+    "CREATE TABLE IF NOT EXISTS tasks_active PARTITION OF tasks FOR VALUES IN ('Active')"
+))
+event.listen(Task.__table__, 'after_create', DDL(
+    "CREATE TABLE IF NOT EXISTS tasks_archive PARTITION OF tasks DEFAULT"
+))
+
+
+def name_search_vector(column):
+    # Search queries must use the same expression as the GIN indexes below
+    return func.to_tsvector(literal_column("'simple'"), func.coalesce(column, literal_column("''")))
+
+
+# Expression indexes are not bound to a table by themselves, so they are attached explicitly
+Task.__table__.append_constraint(
+    Index('ix_tasks_name_search', name_search_vector(Task.name), postgresql_using='gin')
+)
+Project.__table__.append_constraint(
+    Index('ix_projects_name_search', name_search_vector(Project.name), postgresql_using='gin')
+)
+
+# Precomputed task counts, refreshed by the parser after each sync.
+# scope is 'all' (empty key), 'employee' (key is the email) or 'project_members' (key is the project id:
+# all tasks assigned to the project's members, wherever they belong)
+class TaskStatusCount(Base):
+    __tablename__ = 'task_status_counts'
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+class TaskDeadlineCount(Base):
+    __tablename__ = 'task_deadline_counts'
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    deadline = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+# Channel the parser's webhook worker listens on
+WEBHOOK_CHANNEL = 'kanban_webhooks'
+
+# YouGile webhooks are only queued here, the parser applies them
+class WebhookEvent(Base):
+    __tablename__ = 'webhook_events'
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)
+    action = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    # Workspace name from the parser's workspaces file, NULL for the unscoped workspace
+    workspace = Column(String, nullable=True)
+    received_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+# Change log written by the parser, read by GET /changes/stream
+class ChangeEvent(Base):
+    __tablename__ = 'change_events'
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)
+    action = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+# Columns in the order of the API models, used by list queries that skip ORM objects
+EMPLOYEE_COLUMNS = (Employee.email, Employee.first_name, Employee.last_name, Employee.department)
+PROJECT_COLUMNS = (Project.id, Project.name)
+TASK_COLUMNS = (
+    Task.id, Task.name, Task.status, Task.start_date, Task.end_date, Task.deadline,
+    Task.assigned_employee_id, Task.parent_task_id
+)
+SERVICE_LINK_COLUMNS = (Employee.email, ServiceIdentity.service_user_id, ServiceIdentity.service_name)
+
+
+def get_dsn(driver='postgresql'):
+    return (
+        f"{driver}://{os.getenv('DATABASE_USERNAME')}:{os.getenv('DATABASE_PASSWORD')}@"
+        f"{os.getenv('DATABASE_IP')}:{os.getenv('DATABASE_PORT')}/"
+        f"{os.getenv('DATABASE_NAME')}"
+    )
+
+
+def create_engine(dsn=None, **kwargs):
+    # dsn is a plain postgresql:// URL, e.g. of a replica; the primary from DATABASE_* by default
+    url = make_url(dsn).set(drivername='postgresql+asyncpg') if dsn else get_dsn('postgresql+asyncpg')
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_size=int(os.getenv('DATABASE_POOL_SIZE', 10)),
+        max_overflow=int(os.getenv('DATABASE_MAX_OVERFLOW', 20)),
+        pool_pre_ping=os.getenv('DATABASE_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        pool_recycle=int(os.getenv('DATABASE_POOL_RECYCLE', 1800)),
+        **kwargs
+    )
+
+
+def is_connection_error(error):
+    # Errors that say nothing about the query itself, only that the server is unreachable
+    if isinstance(error, OSError):
+        return True
+    return isinstance(error, (OperationalError, InterfaceError)) or error.connection_invalidated
+
 
 class AsyncDatabase:
-    def __init__(self):
-        self.engine = create_async_engine(
-            f"postgresql+asyncpg://{os.getenv('DATABASE_USERNAME')}:{os.getenv('DATABASE_PASSWORD')}@"
-            f"{os.getenv('DATABASE_IP')}:{os.getenv('DATABASE_PORT')}/"
-            f"{os.getenv('DATABASE_NAME')}",
-            echo=False
-        )
-        # print('Connected to database ' + os.getenv('DATABASE_NAME'))
+    def __init__(self, engine=None, replicas=None):
+        self._owns_engine = engine is None
+        self.engine = engine if engine is not None else create_engine()
+        self.replicas = replicas
         self._session = sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        self._read_session = None
+        self._read_replica = None
 
     async def __aenter__(self):
         self.session = self._session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._read_session is not None:
+            await self._read_session.close()
         await self.session.close()
-
-    async def add_update_task(self, task):
-        try:
-            await self.session.merge(task)
-        except Exception as e:
-            print(e)
-        await self.session.commit()
-
-    async def add_update_employee(self, employee):
-        try:
-            await self.session.merge(employee)
-        except Exception as e:
-            print(e)
-        await self.session.commit()
-
-    async def add_update_project(self, project):
-        try:
-            await self.session.merge(project)
-        except Exception as e:
-            print(e)
-        await self.session.commit()
-
-    async def add_update_service_identity(self, service_identity):
-        try:
-           await self.session.merge(service_identity)
-        except Exception as e:
-            print(e)
+        if self._owns_engine:
+            await self.engine.dispose()
+
+    async def _read(self, query):
+        # Read-only queries go to one healthy replica per AsyncDatabase, writes always use self.session.
+        # A replica that fails is taken out of rotation and the query is repeated on the primary.
+        if self._read_session is None and self.replicas is not None:
+            replica = self.replicas.choose()
+            if replica is not None:
+                self._read_session = AsyncSession(replica.engine, expire_on_commit=False)
+                self._read_replica = replica
+        if self._read_session is not None:
+            try:
+                return await self._read_session.execute(query)
+            except (OSError, DBAPIError) as e:
+                if not is_connection_error(e):
+                    raise
+                self.replicas.mark_failed(self._read_replica, e)
+                await self._read_session.close()
+                self._read_session = None
+        return await self.session.execute(query)
+
+    async def enqueue_webhook_event(self, entity, action, key, payload, workspace=None):
+        self.session.add(WebhookEvent(entity=entity, action=action, key=key, payload=payload, workspace=workspace))
+        # Delivered on commit, together with the queued event
+        await self.session.execute(text("SELECT pg_notify(:channel, '')"), {'channel': WEBHOOK_CHANNEL})
         await self.session.commit()
 
     async def get_or_create_service_identity(self, user_id):
@@ -108,52 +232,204 @@ class AsyncDatabase:
             await self.session.commit()
         return service_identity
 
-    async def get_all_employees(self):
-        result = await self.session.execute(select(Employee))
-        return result.scalars().all()
-
-    async def get_all_projects(self):
-        result = await self.session.execute(select(Project))
-        return result.scalars().all()
-
-    async def get_all_tasks(self):
-        result = await self.session.execute(select(Task))
-        return result.scalars().all()
+    async def get_all_employees(self, limit=None, after=None):
+        query = select(*EMPLOYEE_COLUMNS).order_by(Employee.email)
+        if after is not None:
+            query = query.where(Employee.email > after)
+        result = await self._read(query.limit(limit))
+        return result.all()
+
+    async def get_all_projects(self, limit=None, after=None):
+        query = select(*PROJECT_COLUMNS).order_by(Project.id)
+        if after is not None:
+            query = query.where(Project.id > after)
+        result = await self._read(query.limit(limit))
+        return result.all()
+
+    async def get_all_tasks(self, limit=None, after=None, status=None, assigned_employee_id=None,
+                            parent_task_id=None, deadline_from=None, deadline_to=None,
+                            start_date_from=None, start_date_to=None):
+        query = select(*TASK_COLUMNS).order_by(Task.id)
+        if after is not None:
+            query = query.where(Task.id > after)
+        if status:
+            query = query.where(Task.status.in_(status))
+        if assigned_employee_id is not None:
+            query = query.where(Task.assigned_employee_id == assigned_employee_id)
+        if parent_task_id is not None:
+            query = query.where(Task.parent_task_id == parent_task_id)
+        if deadline_from is not None:
+            query = query.where(Task.deadline >= deadline_from)
+        if deadline_to is not None:
+            query = query.where(Task.deadline <= deadline_to)
+        if start_date_from is not None:
+            query = query.where(Task.start_date >= start_date_from)
+        if start_date_to is not None:
+            query = query.where(Task.start_date <= start_date_to)
+        result = await self._read(query.limit(limit))
+        return result.all()
+
+    async def get_task_trees(self, root_id=None, limit=None, after=None, max_depth=20):
+        # Roots are either one task or a page of top-level tasks
+        if root_id is not None:
+            roots = select(Task.id).where(Task.id == root_id)
+        else:
+            roots = select(Task.id).where(Task.parent_task_id.is_(None)).order_by(Task.id).limit(limit)
+            if after is not None:
+                roots = roots.where(Task.id > after)
+
+        tree = select(
+            *TASK_COLUMNS, literal(0).label('depth'), array([Task.id]).label('path')
+        ).where(Task.id.in_(roots)).cte('tree', recursive=True)
+        child = aliased(Task)
+        tree = tree.union_all(
+            select(
+                *[getattr(child, column.key) for column in TASK_COLUMNS],
+                (tree.c.depth + 1).label('depth'),
+                tree.c.path.op('||')(child.id).label('path')
+            )
+            .join(tree, child.parent_task_id == tree.c.id)
+            .where(tree.c.depth < max_depth)
+            .where(~(child.id == any_(tree.c.path)))
+        )
+        result = await self._read(
+            select(*[tree.c[column.key] for column in TASK_COLUMNS], tree.c.depth)
+        )
+        return result.all()
+
+    async def _search(self, columns, name, key, query, limit, after=None, filters=()):
+        vector = name_search_vector(name)
+        tsquery = func.to_tsquery(literal_column("'simple'"), query)
+        rank = func.ts_rank(vector, tsquery)
+        statement = select(*columns, rank.label('rank')).where(vector.op('@@')(tsquery), *filters)
+        if after is not None:
+            after_rank, after_key = after
+            statement = statement.where(or_(rank < after_rank, and_(rank == after_rank, key > after_key)))
+        result = await self._read(statement.order_by(rank.desc(), key).limit(limit))
+        return result.all()
+
+    async def search_tasks(self, query, limit=None, after=None, status=None, assigned_employee_id=None):
+        filters = []
+        if status:
+            filters.append(Task.status.in_(status))
+        if assigned_employee_id is not None:
+            filters.append(Task.assigned_employee_id == assigned_employee_id)
+        return await self._search(TASK_COLUMNS, Task.name, Task.id, query, limit, after, filters)
+
+    async def search_projects(self, query, limit=None, after=None):
+        return await self._search(PROJECT_COLUMNS, Project.name, Project.id, query, limit, after)
 
     async def get_by_email_employee(self, email):
-        result = await self.session.execute(select(Employee).where(Employee.email == email))
+        result = await self._read(select(Employee).where(Employee.email == email))
         return result.scalars().first()
 
     async def get_by_id_project(self, id):
-        result = await self.session.execute(select(Project).where(Project.id == id))
+        result = await self._read(select(Project).where(Project.id == id))
         return result.scalars().first()
 
     async def get_by_id_task(self, id):
-        result = await self.session.execute(select(Task).where(Task.id == id))
+        result = await self._read(select(Task).where(Task.id == id))
         return result.scalars().first()
 
+    async def _get_by_keys(self, columns, key, keys):
+        # The keys are bound as one array parameter, so the statement is the same for any batch size
+        query = select(*columns).where(key == any_(bindparam('keys', keys, type_=ARRAY(String))))
+        result = await self._read(query)
+        return result.all()
+
+    async def get_employees_by_emails(self, emails):
+        return await self._get_by_keys(EMPLOYEE_COLUMNS, Employee.email, emails)
+
+    async def get_projects_by_ids(self, ids):
+        return await self._get_by_keys(PROJECT_COLUMNS, Project.id, ids)
+
+    async def get_tasks_by_ids(self, ids):
+        return await self._get_by_keys(TASK_COLUMNS, Task.id, ids)
+
+    async def get_task_stats(self, scope, key=None, days=7):
+        # Status and deadline counts come from one statement, so both parts are read from the same snapshot
+        statuses = select(
+            TaskStatusCount.key, TaskStatusCount.status, TaskStatusCount.count,
+            null().label('overdue'), null().label('due'),
+        ).where(TaskStatusCount.scope == scope)
+        # Only active tasks are stored here, so overdue and due counts are sums over a deadline range
+        today = func.current_date()
+        deadlines = select(
+            TaskDeadlineCount.key, null(), null(),
+            func.sum(case((TaskDeadlineCount.deadline < today, TaskDeadlineCount.count), else_=0)),
+            func.sum(case((TaskDeadlineCount.deadline >= today, TaskDeadlineCount.count), else_=0)),
+        ).where(TaskDeadlineCount.scope == scope, TaskDeadlineCount.deadline <= today + days).group_by(
+            TaskDeadlineCount.key
+        )
+        if key is not None:
+            statuses = statuses.where(TaskStatusCount.key == key)
+            deadlines = deadlines.where(TaskDeadlineCount.key == key)
+        rows = (await self._read(union_all(statuses, deadlines))).all()
+        status_rows = [(key, status, count) for key, status, count, _, _ in rows if status is not None]
+        deadline_rows = [(key, overdue, due) for key, status, _, overdue, due in rows if status is None]
+        return status_rows, deadline_rows
+
+    async def get_change_log_bounds(self):
+        result = await self.session.execute(select(func.min(ChangeEvent.seq), func.max(ChangeEvent.seq)))
+        return result.one()
+
+    async def get_change_events(self, after, limit):
+        result = await self.session.execute(
+            select(ChangeEvent.seq, ChangeEvent.entity, ChangeEvent.action, ChangeEvent.key, ChangeEvent.created_at)
+            .where(ChangeEvent.seq > after)
+            .order_by(ChangeEvent.seq)
+            .limit(limit)
+        )
+        return result.all()
+
     async def get_assigned_tasks(self, employee_id):
-        result = await self.session.execute(select(Task).where(Task.assigned_employee_id == employee_id))
-        return result.scalars().all()
+        result = await self._read(select(*TASK_COLUMNS).where(Task.assigned_employee_id == employee_id))
+        return result.all()
 
     async def get_tasks_by_email(self, email):
-        query = select(Task).join(ServiceIdentity).join(Employee).where(Employee.email == email)
-        result = await self.session.execute(query)
-        return result.scalars().all()
+        query = select(*TASK_COLUMNS).join(ServiceIdentity).join(Employee).where(Employee.email == email)
+        result = await self._read(query)
+        return result.all()
 
     async def get_service_identities_by_employee_email(self, email: str):
-        result = await self.session.execute(select(Employee).where(Employee.email == email))
-        employee = result.scalars().first()
-        if employee:
-            await self.session.refresh(employee, ["service_identities"])
-        return employee
+        result = await self._read(
+            select(Employee).options(selectinload(Employee.service_identities)).where(Employee.email == email)
+        )
+        return result.scalars().first()
+
+    async def get_employee_profile(self, email):
+        # Four flat queries whatever the profile size: the employee, their identities, and then
+        # projects and tasks of all identities at once through one array parameter
+        employee = (await self._read(select(*EMPLOYEE_COLUMNS).where(Employee.email == email))).first()
+        if employee is None:
+            return None, [], [], []
+        identities = (await self._read(
+            select(ServiceIdentity.service_user_id, ServiceIdentity.service_name)
+            .where(ServiceIdentity.employee_email == email)
+            .order_by(ServiceIdentity.service_user_id)
+        )).all()
+        if not identities:
+            return employee, identities, [], []
+        ids = bindparam('ids', [identity.service_user_id for identity in identities], type_=ARRAY(String))
+        projects = (await self._read(
+            select(*PROJECT_COLUMNS).where(
+                Project.id.in_(
+                    select(project_members.c.project_id).where(project_members.c.service_user_id == any_(ids))
+                )
+            ).order_by(Project.id)
+        )).all()
+        tasks = (await self._read(
+            select(*TASK_COLUMNS).where(Task.assigned_employee_id == any_(ids)).order_by(Task.id)
+        )).all()
+        return employee, identities, projects, tasks
 
     async def get_all_service_links(self):
-        result = await self.session.execute(
-            select(Employee)
-            .options(joinedload(Employee.service_identities))
+        # One flat row per identity instead of employees with their identity collections
+        result = await self._read(
+            select(*SERVICE_LINK_COLUMNS).join(ServiceIdentity.employee)
+            .order_by(Employee.email, ServiceIdentity.service_user_id)
         )
-        return result.unique().scalars().all()
+        return result.all()
 
 
 async def create_database():
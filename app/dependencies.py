@@ -1,8 +1,10 @@
-from fastapi import Security, HTTPException
+from fastapi import Security, HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 from dotenv import load_dotenv, find_dotenv
 
+from databases import AsyncDatabase
+
 load_dotenv(find_dotenv())
 
 security = HTTPBearer()
@@ -11,3 +13,9 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Security(securi
     if credentials.credentials != os.getenv("API_TOKEN"):
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     return {"user": "authenticated"}
+
+async def get_db(request: Request):
+    # Set by CachedRoute right after a sync, when replicas may not have replayed it yet
+    replicas = None if getattr(request.state, 'read_primary', False) else request.app.state.replicas
+    async with AsyncDatabase(request.app.state.engine, replicas) as db:
+        yield db
@@ -0,0 +1,141 @@
+import asyncio
+import io
+import os
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Date, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+
+from databases import (
+    EMPLOYEE_COLUMNS, PROJECT_COLUMNS, SERVICE_LINK_COLUMNS, TASK_COLUMNS, Employee, Project, ServiceIdentity,
+    Task, is_connection_error, project_members
+)
+
+# Rows fetched from the server-side cursor at a time, also the Parquet row group size
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 10000))
+# COPY chunks buffered while the client is slower than the database
+EXPORT_QUEUE_SIZE = 64
+
+EXPORT_QUERIES = {
+    'tasks': select(*TASK_COLUMNS).order_by(Task.id),
+    'employees': select(*EMPLOYEE_COLUMNS).order_by(Employee.email),
+    'projects': select(*PROJECT_COLUMNS).order_by(Project.id),
+    'project_members': select(project_members)
+    .order_by(project_members.c.project_id, project_members.c.service_user_id),
+    'service_links': select(*SERVICE_LINK_COLUMNS).join(ServiceIdentity.employee)
+    .order_by(Employee.email, ServiceIdentity.service_user_id),
+}
+
+EXPORT_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+async def connect(engine, replicas):
+    # Exports read from a healthy replica when there is one. A stream cannot move to another
+    # server once rows were sent, so only a failed connect falls back to the primary.
+    replica = replicas.choose() if replicas is not None else None
+    if replica is not None:
+        try:
+            return await replica.engine.connect()
+        except (OSError, DBAPIError) as e:
+            if not is_connection_error(e):
+                raise
+            replicas.mark_failed(replica, e)
+    return await engine.connect()
+
+
+async def stream_ndjson(conn, query):
+    result = await conn.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    # Column labels are str subclasses, which orjson does not accept as keys
+    fields = [str(field) for field in result.keys()]
+    async for rows in result.partitions():
+        yield b''.join(orjson.dumps(dict(zip(fields, row))) + b'\n' for row in rows)
+
+
+async def stream_csv(conn, query):
+    # COPY formats the rows on the server, the chunks are passed through as they arrive
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    raw = await conn.get_raw_connection()
+    queue = asyncio.Queue(EXPORT_QUEUE_SIZE)
+
+    async def copy():
+        try:
+            await raw.driver_connection.copy_from_query(sql, output=queue.put, format='csv', header=True)
+        finally:
+            await queue.put(None)
+
+    task = asyncio.create_task(copy())
+    try:
+        while (chunk := await queue.get()) is not None:
+            yield bytes(chunk)
+        await task
+    finally:
+        task.cancel()
+
+
+class ChunkSink(io.RawIOBase):
+    # File object for ParquetWriter that hands written bytes over to the response
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_schema(query):
+    return pa.schema([
+        (column.name, pa.date32() if isinstance(column.type, Date) else pa.string())
+        for column in query.selected_columns
+    ])
+
+
+async def stream_parquet(conn, query):
+    # Each cursor partition becomes one row group, so only one batch is held in memory
+    schema = parquet_schema(query)
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    result = await conn.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for rows in result.partitions():
+        writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)], schema=schema
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    'ndjson': stream_ndjson,
+    'csv': stream_csv,
+    'parquet': stream_parquet,
+}
+
+
+async def stream_export(engine, replicas, entity, format):
+    conn = await connect(engine, replicas)
+    try:
+        async for chunk in EXPORT_FORMATS[format](conn, EXPORT_QUERIES[entity]):
+            if chunk:
+                yield chunk
+    finally:
+        await conn.close()
@@ -1,13 +1,48 @@
-from fastapi import FastAPI, Depends
-from routers import employees, projects, tasks
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from cache import SYNC_CHANNEL, ResponseCache
+from changes import CHANGES_CHANNEL, ChangeFeed
+from databases import create_engine, get_dsn
+from metrics import MetricsMiddleware, TimedQueuePool, instrument_engine, metrics_endpoint
+from notifications import PgListener
+from replicas import ReplicaSet
+from routers import changes, employees, export, projects, stats, tasks, webhooks
 # from .dependencies import get_current_user
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.engine = create_engine(poolclass=TimedQueuePool)
+    instrument_engine(app.state.engine)
+    app.state.replicas = ReplicaSet.from_env(poolclass=TimedQueuePool)
+    if app.state.replicas is not None:
+        for engine in app.state.replicas.engines:
+            instrument_engine(engine)
+        await app.state.replicas.start()
+    app.state.response_cache = ResponseCache()
+    app.state.listener = PgListener(get_dsn())
+    app.state.listener.add_callback(SYNC_CHANNEL, app.state.response_cache.on_notify)
+    app.state.listener.on_connect(app.state.response_cache.load_generation)
+    app.state.change_feed = ChangeFeed()
+    app.state.listener.add_callback(CHANGES_CHANNEL, app.state.change_feed.on_notify)
+    app.state.listener.on_connect(app.state.change_feed.load_last_seq)
+    await app.state.listener.start()
+    yield
+    await app.state.listener.stop()
+    if app.state.replicas is not None:
+        await app.state.replicas.stop()
+    await app.state.engine.dispose()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
 
 app.include_router(employees.router, prefix="/employees", tags=["employees"])
 app.include_router(projects.router, prefix="/projects", tags=["projects"])
 app.include_router(tasks.router, prefix="/tasks", tags=["tasks"])
+app.include_router(stats.router, prefix="/stats", tags=["stats"])
+app.include_router(changes.router, prefix="/changes", tags=["changes"])
+app.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
+app.include_router(export.router, prefix="/export", tags=["export"])
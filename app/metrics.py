@@ -0,0 +1,108 @@
+import time
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.routing import Match
+
+REQUEST_DURATION = Histogram(
+    'kanban_api_request_duration_seconds', 'HTTP request latency', ['method', 'route', 'status']
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'kanban_api_requests_in_flight', 'HTTP requests being handled', ['method', 'route']
+)
+DB_STATEMENT_DURATION = Histogram(
+    'kanban_api_db_statement_duration_seconds', 'Database statement execution time', ['operation']
+)
+DB_STATEMENT_ERRORS = Counter(
+    'kanban_api_db_statement_errors_total', 'Database statements that raised an error', ['operation']
+)
+DB_POOL_CHECKOUT_DURATION = Histogram(
+    'kanban_api_db_pool_checkout_seconds', 'Time spent waiting for a pooled connection',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_REPLICA_HEALTHY = Gauge(
+    'kanban_api_db_replica_healthy', 'Whether a read replica receives queries', ['replica']
+)
+DB_REPLICA_LAG = Gauge(
+    'kanban_api_db_replica_lag_seconds', 'Replay lag of a read replica', ['replica']
+)
+RESPONSE_CACHE_REQUESTS = Counter(
+    'kanban_api_response_cache_requests_total', 'Response cache lookups', ['result']
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_DURATION.observe(time.perf_counter() - started)
+
+
+def statement_operation(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+
+
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['statement_started'].pop()
+        DB_STATEMENT_DURATION.labels(statement_operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, 'handle_error')
+    def handle_error(context):
+        stack = context.connection.info.get('statement_started') if context.connection is not None else None
+        if stack:
+            stack.pop()
+        DB_STATEMENT_ERRORS.labels(statement_operation(context.statement or '')).inc()
+
+
+def route_path(scope):
+    # The route template keeps label cardinality bounded: /tasks/{id} rather than every id
+    for route in scope['app'].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unmatched'
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        route = route_path(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+
+async def metrics_endpoint():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
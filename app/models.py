@@ -1,7 +1,10 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, List, Optional
 from datetime import date
 
+# Upper bound for the number of keys in one batch lookup
+MAX_BATCH_SIZE = 5000
+
 
 class ServiceIdentityRead(BaseModel):
     service_user_id: str
@@ -37,6 +40,14 @@ class EmployeeServiceLink(BaseModel):
         from_attributes = True
 class EmployeeList(BaseModel):
     employees: List[Employee]
+    next_cursor: Optional[str] = None
+
+class EmployeeBatchRequest(BaseModel):
+    emails: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+class EmployeeBatch(BaseModel):
+    employees: List[Employee]
+    missing: List[str]
 
 class ProjectBase(BaseModel):
     id: str
@@ -49,6 +60,21 @@ class Project(ProjectBase):
 
 class ProjectList(BaseModel):
     projects: List[Project]
+    next_cursor: Optional[str] = None
+
+class ProjectSearchResult(Project):
+    rank: float
+
+class ProjectSearchList(BaseModel):
+    projects: List[ProjectSearchResult]
+    next_cursor: Optional[str] = None
+
+class ProjectBatchRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+class ProjectBatch(BaseModel):
+    projects: List[Project]
+    missing: List[str]
 
 class TaskBase(BaseModel):
     id: str
@@ -68,3 +94,84 @@ class Task(TaskBase):
 
 class TaskList(BaseModel):
     tasks: List[Task]
+    next_cursor: Optional[str] = None
+
+class TaskSearchResult(Task):
+    rank: float
+
+class TaskSearchList(BaseModel):
+    tasks: List[TaskSearchResult]
+    next_cursor: Optional[str] = None
+
+class TaskBatchRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+class TaskBatch(BaseModel):
+    tasks: List[Task]
+    missing: List[str]
+
+class TaskRollup(BaseModel):
+    total: int
+    active: int
+    completed: int
+    archived: int
+
+class TaskTree(Task):
+    depth: int
+    descendants: TaskRollup
+    subtasks: List['TaskTree']
+
+class TaskTreeList(BaseModel):
+    tasks: List[TaskTree]
+    next_cursor: Optional[str] = None
+
+class EmployeeProfile(Employee):
+    service_identities: List[ServiceIdentityRead]
+    projects: List[Project]
+    task_statuses: Dict[str, int]
+    tasks: List[Task]
+
+class TaskStats(BaseModel):
+    key: str
+    total: int
+    statuses: Dict[str, int]
+    overdue: int
+    due: int
+
+class TaskStatsList(BaseModel):
+    days: int
+    stats: List[TaskStats]
+
+# YouGile webhook payloads. Only the fields used by the parser's mapping are checked,
+# everything else is kept as is.
+class YouGileUser(BaseModel):
+    model_config = ConfigDict(extra='allow')
+    id: str
+    email: str
+    realName: Optional[str] = None
+
+class YouGileProject(BaseModel):
+    model_config = ConfigDict(extra='allow')
+    id: str
+    title: str
+    users: Dict[str, Any] = {}
+
+class YouGileTask(BaseModel):
+    model_config = ConfigDict(extra='allow')
+    id: str
+    title: str
+    timestamp: int
+    archived: bool = False
+    completed: bool = False
+    subtasks: List[str] = []
+
+class YouGileDeleted(BaseModel):
+    model_config = ConfigDict(extra='allow')
+    id: str
+
+class YouGileWebhook(BaseModel):
+    event: str = Field(pattern=r'^[a-z]+-[a-z-]+$')
+    payload: Dict[str, Any]
+
+class WebhookAccepted(BaseModel):
+    queued: bool
@@ -0,0 +1,60 @@
+import asyncio
+
+import asyncpg
+
+RECONNECT_DELAY = 5
+KEEPALIVE_INTERVAL = 30
+
+
+class PgListener:
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self._callbacks = {}
+        self._on_connect = []
+        self._task = None
+
+    def add_callback(self, channel, callback):
+        self._callbacks.setdefault(channel, []).append(callback)
+
+    def on_connect(self, callback):
+        # Called with the fresh connection after every (re)connect, so state
+        # missed while disconnected can be reloaded
+        self._on_connect.append(callback)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _dispatch(self, connection, pid, channel, payload):
+        for callback in self._callbacks.get(channel, []):
+            callback(payload)
+
+    async def _run(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda conn: closed.set())
+                for channel in self._callbacks:
+                    await connection.add_listener(channel, self._dispatch)
+                for callback in self._on_connect:
+                    await callback(connection)
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), KEEPALIVE_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await connection.execute("SELECT 1")
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                print(f"Notification listener disconnected: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
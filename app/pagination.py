@@ -0,0 +1,36 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+
+def encode_cursor(*values):
+    payload = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    # types: the expected type of each cursor value, a cursor of another shape is a client error
+    if cursor is None:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types) or not all(
+        isinstance(value, value_type) and not isinstance(value, bool) for value, value_type in zip(values, types)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def paginate(items, limit, key):
+    # Queries fetch limit + 1 rows, the extra row means there is a next page
+    if len(items) > limit:
+        items = items[:limit]
+        return items, encode_cursor(*key(items[-1]))
+    return items, None
@@ -0,0 +1,104 @@
+import asyncio
+import os
+
+from sqlalchemy import text
+
+from databases import create_engine
+from metrics import DB_REPLICA_HEALTHY, DB_REPLICA_LAG
+
+# Comma-separated postgresql:// URLs of read replicas, reads go to the primary when empty
+DATABASE_REPLICA_DSNS = os.getenv('DATABASE_REPLICA_DSNS', '')
+# Seconds of replay lag after which a replica stops receiving reads
+DATABASE_REPLICA_MAX_LAG = float(os.getenv('DATABASE_REPLICA_MAX_LAG', 30))
+DATABASE_REPLICA_CHECK_INTERVAL = float(os.getenv('DATABASE_REPLICA_CHECK_INTERVAL', 5))
+
+# Zero when the standby has replayed everything it received, otherwise the age of the last replayed
+# transaction; NULL on a server that is not in recovery
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    __slots__ = ('engine', 'name', 'healthy', 'lag')
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.name = f"{engine.url.host}:{engine.url.port or 5432}"
+        self.healthy = False
+        self.lag = None
+
+
+class ReplicaSet:
+    def __init__(self, dsns, max_lag=DATABASE_REPLICA_MAX_LAG, check_interval=DATABASE_REPLICA_CHECK_INTERVAL,
+                 **engine_kwargs):
+        self.replicas = [Replica(create_engine(dsn, **engine_kwargs)) for dsn in dsns]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = 0
+        self._task = None
+
+    @classmethod
+    def from_env(cls, **engine_kwargs):
+        dsns = [dsn.strip() for dsn in DATABASE_REPLICA_DSNS.split(',') if dsn.strip()]
+        return cls(dsns, **engine_kwargs) if dsns else None
+
+    @property
+    def engines(self):
+        return [replica.engine for replica in self.replicas]
+
+    def choose(self):
+        # Round-robin over healthy replicas, None sends the read to the primary
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next]
+            self._next = (self._next + 1) % len(self.replicas)
+            if replica.healthy:
+                return replica
+        return None
+
+    def mark_failed(self, replica, error):
+        if replica.healthy:
+            print(f"Replica {replica.name} failed, reading from the primary: {error}")
+        self._set_health(replica, False)
+
+    def _set_health(self, replica, healthy):
+        replica.healthy = healthy
+        DB_REPLICA_HEALTHY.labels(replica.name).set(1 if healthy else 0)
+
+    async def check(self, replica):
+        try:
+            async with replica.engine.connect() as conn:
+                lag = (await conn.execute(LAG_QUERY)).scalar()
+        except Exception as e:
+            self.mark_failed(replica, e)
+            return
+        replica.lag = float(lag or 0)
+        DB_REPLICA_LAG.labels(replica.name).set(replica.lag)
+        healthy = replica.lag <= self.max_lag
+        if healthy != replica.healthy:
+            print(f"Replica {replica.name} is {'healthy' if healthy else 'lagging'}, lag {replica.lag:.1f}s")
+        self._set_health(replica, healthy)
+
+    async def check_all(self):
+        await asyncio.gather(*[self.check(replica) for replica in self.replicas])
+
+    async def start(self):
+        # The first check runs before the API starts serving, so no read goes to a dead replica
+        await self.check_all()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_all()
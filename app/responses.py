@@ -0,0 +1,16 @@
+from fastapi.responses import ORJSONResponse
+
+
+def rows_response(name, rows, **extra):
+    # Rows from column-projected queries go straight to orjson, without ORM
+    # objects or a second pass of pydantic validation
+    fields = rows[0]._fields if rows else ()
+    return ORJSONResponse({name: [dict(zip(fields, row)) for row in rows], **extra})
+
+
+def batch_response(name, rows, keys, key):
+    # Found rows follow the order of the requested keys, unknown keys are listed in `missing`
+    found = {getattr(row, key): row for row in rows}
+    return rows_response(
+        name, [found[k] for k in keys if k in found], missing=[k for k in keys if k not in found]
+    )
@@ -0,0 +1,23 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from changes import stream_changes
+from dependencies import get_current_user
+
+router = APIRouter()
+
+@router.get("/stream")
+async def get_changes_stream(
+    request: Request,
+    after: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[int] = Header(None, ge=0),
+    user=Depends(get_current_user)
+):
+    # EventSource resends the id of the last received event in Last-Event-ID on reconnect
+    start = last_event_id if last_event_id is not None else after
+    return StreamingResponse(
+        stream_changes(request.app.state.engine, request.app.state.change_feed, start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,50 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.future import select
-from dependencies import get_current_user
+from collections import Counter
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from cache import CachedRoute
+from dependencies import get_current_user, get_db
 from databases import AsyncDatabase
-from models import Employee, EmployeeList, EmployeeRead, EmployeeServiceLink
-from typing import List
+from models import (
+    Employee, EmployeeBatch, EmployeeBatchRequest, EmployeeList, EmployeeProfile, EmployeeRead, EmployeeServiceLink
+)
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, paginate
+from responses import batch_response, rows_response
+from typing import List, Optional
 
 
-router = APIRouter()
+router = APIRouter(route_class=CachedRoute)
 
 @router.get("/", response_model=EmployeeList)
-async def get_all_employees(user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        employees = await db.get_all_employees()
-        employee_list = [Employee.from_orm(emp) for emp in employees]
-        return EmployeeList(employees=employee_list)
+async def get_all_employees(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+    db: AsyncDatabase = Depends(get_db)
+):
+    after = decode_cursor(cursor, str)
+    employees = await db.get_all_employees(limit=limit + 1, after=after[0] if after else None)
+    employees, next_cursor = paginate(employees, limit, key=lambda emp: (emp.email,))
+    return rows_response('employees', employees, next_cursor=next_cursor)
+
+@router.post("/batch", response_model=EmployeeBatch)
+async def get_employees_batch(
+    batch: EmployeeBatchRequest, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)
+):
+    emails = list(dict.fromkeys(batch.emails))
+    employees = await db.get_employees_by_emails(emails)
+    return batch_response('employees', employees, emails, 'email')
 
 @router.post("/{email}", response_model=Employee)
-async def get_employee_by_email(email: str, user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        employee = await db.get_by_email_employee(email)
-        if employee is None:
-            raise HTTPException(status_code=404, detail="Employee not found")
-        return Employee.from_orm(employee)
+async def get_employee_by_email(email: str, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    employee = await db.get_by_email_employee(email)
+    if employee is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return Employee.from_orm(employee)
 
 @router.post("/service_identity/{email}", response_model=EmployeeRead)
-async def get_service_identities(email: str, user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        employee = await db.get_service_identities_by_employee_email(email)
-        if employee is None:
-            raise HTTPException(status_code=404, detail="Employee not found")
-        return EmployeeRead.from_orm(employee)
+async def get_service_identities(email: str, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    employee = await db.get_service_identities_by_employee_email(email)
+    if employee is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return EmployeeRead.from_orm(employee)
+
 
+@router.get("/{email}/profile", response_model=EmployeeProfile)
+async def get_employee_profile(email: str, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    # Replaces the employee, service identity, tasks and per-project calls of a profile view
+    employee, identities, projects, tasks = await db.get_employee_profile(email)
+    if employee is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return ORJSONResponse({
+        **employee._asdict(),
+        'service_identities': [identity._asdict() for identity in identities],
+        'projects': [project._asdict() for project in projects],
+        'task_statuses': dict(Counter(task.status for task in tasks)),
+        'tasks': [task._asdict() for task in tasks],
+    })
 
 @router.get("/service_links", response_model=List[EmployeeServiceLink])
-async def get_all_service_links(user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        employees = await db.get_all_service_links()
-
-        service_links = []
-        for employee in employees:
-            for service_identity in employee.service_identities:
-                service_link = EmployeeServiceLink(
-                    email=employee.email,
-                    service_user_id=service_identity.service_user_id,
-                    service_name=service_identity.service_name
-                )
-                service_links.append(service_link)
-
-        return service_links
\ No newline at end of file
+async def get_all_service_links(user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    service_links = await db.get_all_service_links()
+    return ORJSONResponse([link._asdict() for link in service_links])
@@ -0,0 +1,23 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from dependencies import get_current_user
+from export import EXPORT_MEDIA_TYPES, EXPORT_QUERIES, stream_export
+
+router = APIRouter()
+
+@router.get("/{entity}")
+async def export_entity(
+    entity: str,
+    request: Request,
+    format: Literal['ndjson', 'csv', 'parquet'] = 'ndjson',
+    user=Depends(get_current_user)
+):
+    if entity not in EXPORT_QUERIES:
+        raise HTTPException(status_code=404, detail="Unknown export entity")
+    return StreamingResponse(
+        stream_export(request.app.state.engine, request.app.state.replicas, entity, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'}
+    )
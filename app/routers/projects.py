@@ -1,21 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException
-from dependencies import get_current_user
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from cache import CachedRoute
+from dependencies import get_current_user, get_db
 from databases import AsyncDatabase
-from models import Project, ProjectList
+from models import Project, ProjectBatch, ProjectBatchRequest, ProjectList, ProjectSearchList
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, paginate
+from responses import batch_response, rows_response
+from search import search_cursor, search_query
 
-router = APIRouter()
+router = APIRouter(route_class=CachedRoute)
 
 @router.get("/", response_model=ProjectList)
-async def get_all_projects(user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        projects = await db.get_all_projects()
-        project_list = [Project.from_orm(proj) for proj in projects]
-        return ProjectList(projects=project_list)
+async def get_all_projects(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+    db: AsyncDatabase = Depends(get_db)
+):
+    after = decode_cursor(cursor, str)
+    projects = await db.get_all_projects(limit=limit + 1, after=after[0] if after else None)
+    projects, next_cursor = paginate(projects, limit, key=lambda proj: (proj.id,))
+    return rows_response('projects', projects, next_cursor=next_cursor)
+
+@router.get("/search", response_model=ProjectSearchList)
+async def search_projects(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+    db: AsyncDatabase = Depends(get_db)
+):
+    projects = await db.search_projects(search_query(q), limit=limit + 1, after=search_cursor(cursor))
+    projects, next_cursor = paginate(projects, limit, key=lambda proj: (proj.rank, proj.id))
+    return rows_response('projects', projects, next_cursor=next_cursor)
+
+@router.post("/batch", response_model=ProjectBatch)
+async def get_projects_batch(
+    batch: ProjectBatchRequest, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)
+):
+    ids = list(dict.fromkeys(batch.ids))
+    projects = await db.get_projects_by_ids(ids)
+    return batch_response('projects', projects, ids, 'id')
 
 @router.post("/{id}", response_model=Project)
-async def get_project_by_id(id: str, user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        project = await db.get_by_id_project(id)
-        if project is None:
-            raise HTTPException(status_code=404, detail="Project not found")
-        return Project.from_orm(project)
+async def get_project_by_id(id: str, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    project = await db.get_by_id_project(id)
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return Project.from_orm(project)
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+from cache import CachedRoute
+from dependencies import get_current_user, get_db
+from databases import AsyncDatabase
+from models import TaskStats, TaskStatsList
+from stats import build_task_stats, empty_stats
+
+router = APIRouter(route_class=CachedRoute)
+
+# `due` counts active tasks with a deadline between today and today + days, `overdue` those before today
+DAYS_QUERY = Query(7, ge=0, le=365)
+
+
+async def _stats_list(db, scope, days):
+    stats = build_task_stats(*await db.get_task_stats(scope, days=days))
+    return ORJSONResponse({'days': days, 'stats': stats})
+
+
+async def _stats_one(db, scope, key, days):
+    stats = build_task_stats(*await db.get_task_stats(scope, key=key, days=days))
+    return ORJSONResponse(stats[0] if stats else empty_stats(key))
+
+
+@router.get("/tasks", response_model=TaskStats)
+async def get_task_stats(days: int = DAYS_QUERY, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    return await _stats_one(db, 'all', '', days)
+
+@router.get("/employees", response_model=TaskStatsList)
+async def get_employee_stats(
+    days: int = DAYS_QUERY, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)
+):
+    return await _stats_list(db, 'employee', days)
+
+@router.get("/employees/{email}", response_model=TaskStats)
+async def get_employee_stats_by_email(
+    email: str, days: int = DAYS_QUERY, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)
+):
+    return await _stats_one(db, 'employee', email, days)
+
+# Tasks have no project reference: these are all tasks assigned to the project's members,
+# including their tasks in other projects, so they are not per-project counts
+@router.get("/project_members", response_model=TaskStatsList)
+async def get_project_member_stats(
+    days: int = DAYS_QUERY, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)
+):
+    return await _stats_list(db, 'project_members', days)
+
+@router.get("/project_members/{id}", response_model=TaskStats)
+async def get_project_member_stats_by_id(
+    id: str, days: int = DAYS_QUERY, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)
+):
+    return await _stats_one(db, 'project_members', id, days)
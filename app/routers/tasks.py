@@ -1,35 +1,113 @@
-from fastapi import APIRouter, Depends, HTTPException
-from dependencies import get_current_user
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from cache import CachedRoute
+from dependencies import get_current_user, get_db
 from databases import AsyncDatabase
-from models import Task, TaskList
+from fastapi.responses import ORJSONResponse
+from models import Task, TaskBatch, TaskBatchRequest, TaskList, TaskSearchList, TaskTree, TaskTreeList
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, paginate
+from responses import batch_response, rows_response
+from search import search_cursor, search_query
+from trees import build_task_trees
 
-router = APIRouter()
+router = APIRouter(route_class=CachedRoute)
 
 @router.get("/", response_model=TaskList)
-async def get_all_tasks(user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        tasks = await db.get_all_tasks()
-        task_list = [Task.from_orm(task) for task in tasks]
-        return TaskList(tasks=task_list)
+async def get_all_tasks(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    # Only the active partition is read unless other statuses are asked for explicitly
+    status: List[str] = Query(['Active']),
+    assigned_employee_id: Optional[str] = None,
+    parent_task_id: Optional[str] = None,
+    deadline_from: Optional[date] = None,
+    deadline_to: Optional[date] = None,
+    start_date_from: Optional[date] = None,
+    start_date_to: Optional[date] = None,
+    user=Depends(get_current_user),
+    db: AsyncDatabase = Depends(get_db)
+):
+    after = decode_cursor(cursor, str)
+    tasks = await db.get_all_tasks(
+        limit=limit + 1,
+        after=after[0] if after else None,
+        status=status,
+        assigned_employee_id=assigned_employee_id,
+        parent_task_id=parent_task_id,
+        deadline_from=deadline_from,
+        deadline_to=deadline_to,
+        start_date_from=start_date_from,
+        start_date_to=start_date_to
+    )
+    tasks, next_cursor = paginate(tasks, limit, key=lambda task: (task.id,))
+    return rows_response('tasks', tasks, next_cursor=next_cursor)
+
+@router.get("/tree", response_model=TaskTreeList)
+async def get_task_trees(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    max_depth: int = Query(20, ge=0, le=100),
+    user=Depends(get_current_user),
+    db: AsyncDatabase = Depends(get_db)
+):
+    after = decode_cursor(cursor, str)
+    rows = await db.get_task_trees(limit=limit + 1, after=after[0] if after else None, max_depth=max_depth)
+    roots, next_cursor = paginate(build_task_trees(rows), limit, key=lambda root: (root['id'],))
+    return ORJSONResponse({'tasks': roots, 'next_cursor': next_cursor})
+
+@router.get("/search", response_model=TaskSearchList)
+async def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    assigned_employee_id: Optional[str] = None,
+    user=Depends(get_current_user),
+    db: AsyncDatabase = Depends(get_db)
+):
+    tasks = await db.search_tasks(
+        search_query(q),
+        limit=limit + 1,
+        after=search_cursor(cursor),
+        status=status,
+        assigned_employee_id=assigned_employee_id
+    )
+    tasks, next_cursor = paginate(tasks, limit, key=lambda task: (task.rank, task.id))
+    return rows_response('tasks', tasks, next_cursor=next_cursor)
+
+@router.get("/{id}/tree", response_model=TaskTree)
+async def get_task_tree(
+    id: str,
+    max_depth: int = Query(20, ge=0, le=100),
+    user=Depends(get_current_user),
+    db: AsyncDatabase = Depends(get_db)
+):
+    rows = await db.get_task_trees(root_id=id, max_depth=max_depth)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return ORJSONResponse(build_task_trees(rows)[0])
+
+@router.post("/batch", response_model=TaskBatch)
+async def get_tasks_batch(batch: TaskBatchRequest, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    ids = list(dict.fromkeys(batch.ids))
+    tasks = await db.get_tasks_by_ids(ids)
+    return batch_response('tasks', tasks, ids, 'id')
 
 @router.post("/{id}", response_model=Task)
-async def get_tasks_by_id(id: str, user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        task = await db.get_by_id_task(id)
-        if task is None:
-            raise HTTPException(status_code=404, detail="Task not found")
-        return Task.from_orm(task)
+async def get_tasks_by_id(id: str, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    task = await db.get_by_id_task(id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return Task.from_orm(task)
 
 @router.post("/assigned/{id}", response_model=TaskList)
-async def get_tasks_assigned_to_employee(id: str, user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        tasks = await db.get_assigned_tasks(id)
-        task_list = [Task.from_orm(task) for task in tasks]
-        return TaskList(tasks=task_list)
+async def get_tasks_assigned_to_employee(id: str, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    tasks = await db.get_assigned_tasks(id)
+    return rows_response('tasks', tasks, next_cursor=None)
 
 @router.post("/email/{email}", response_model=TaskList)
-async def get_tasks_by_employee_email(email: str, user=Depends(get_current_user)):
-    async with AsyncDatabase() as db:
-        tasks = await db.get_tasks_by_email(email)
-        task_list = [Task.from_orm(task) for task in tasks]
-        return TaskList(tasks=task_list)
+async def get_tasks_by_employee_email(email: str, user=Depends(get_current_user), db: AsyncDatabase = Depends(get_db)):
+    tasks = await db.get_tasks_by_email(email)
+    return rows_response('tasks', tasks, next_cursor=None)
@@ -0,0 +1,46 @@
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import ValidationError
+from dependencies import get_db
+from databases import AsyncDatabase
+from models import WebhookAccepted, YouGileDeleted, YouGileProject, YouGileTask, YouGileUser, YouGileWebhook
+
+router = APIRouter()
+
+# YouGile calls the subscribed URL as is, so the secret is passed in the query string
+YOUGILE_WEBHOOK_SECRET = os.getenv('YOUGILE_WEBHOOK_SECRET')
+
+# YouGile event prefix -> (entity in the sync, payload model)
+WEBHOOK_ENTITIES = {
+    'user': ('employees', YouGileUser),
+    'project': ('projects', YouGileProject),
+    'task': ('tasks', YouGileTask),
+}
+
+
+@router.post("/yougile", response_model=WebhookAccepted, status_code=202)
+async def receive_yougile_webhook(
+    webhook: YouGileWebhook,
+    secret: str = Query(...),
+    # Each workspace subscribes with its own name, so the parser applies the event with its key scope
+    workspace: Optional[str] = Query(None, pattern=r'^[a-z0-9][a-z0-9_-]*$'),
+    db: AsyncDatabase = Depends(get_db),
+):
+    if not YOUGILE_WEBHOOK_SECRET or not hmac.compare_digest(secret, YOUGILE_WEBHOOK_SECRET):
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+    prefix, action = webhook.event.split('-', 1)
+    if prefix not in WEBHOOK_ENTITIES:
+        # Boards, columns, chats and other events do not affect the synced tables
+        return {'queued': False}
+    entity, model = WEBHOOK_ENTITIES[prefix]
+    if action == 'deleted':
+        model = YouGileDeleted
+    try:
+        payload = model.model_validate(webhook.payload).model_dump()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    await db.enqueue_webhook_event(entity, action, payload['id'], payload, workspace)
+    return {'queued': True}
@@ -0,0 +1,19 @@
+import re
+
+from fastapi import HTTPException
+
+from pagination import decode_cursor
+
+
+def search_query(q):
+    # All words must be present. Only the last one is matched as a prefix, as it may still be
+    # being typed: a prefix match reads every matching lexeme from the index, an exact word does not.
+    words = re.findall(r'\w+', q.lower())
+    if not words:
+        raise HTTPException(status_code=400, detail="Search query has no words")
+    return ' & '.join(words[:-1] + [f"{words[-1]}:*"])
+
+
+def search_cursor(cursor):
+    # Search results are ordered by (rank, id), so the cursor carries both
+    return decode_cursor(cursor, (int, float), str)
@@ -0,0 +1,16 @@
+def empty_stats(key):
+    return {'key': key, 'total': 0, 'statuses': {}, 'overdue': 0, 'due': 0}
+
+
+def build_task_stats(status_rows, deadline_rows):
+    # Rows come from the summary tables: (key, status, count) and (key, overdue, due)
+    stats = {}
+    for key, status, count in status_rows:
+        entry = stats.setdefault(key, empty_stats(key))
+        entry['statuses'][status] = count
+        entry['total'] += count
+    for key, overdue, due in deadline_rows:
+        entry = stats.setdefault(key, empty_stats(key))
+        entry['overdue'] = overdue
+        entry['due'] = due
+    return [stats[key] for key in sorted(stats)]
@@ -0,0 +1,34 @@
+ROLLUP_STATUSES = {'Active': 'active', 'Completed': 'completed', 'Archived': 'archived'}
+
+
+def empty_rollup():
+    return {'total': 0, 'active': 0, 'completed': 0, 'archived': 0}
+
+
+def build_task_trees(rows):
+    # Rows come from the recursive CTE: task columns followed by depth
+    nodes = {}
+    for row in rows:
+        node = row._asdict()
+        node['descendants'] = empty_rollup()
+        node['subtasks'] = []
+        nodes[node['id']] = node
+
+    roots = []
+    # Deepest nodes first, so every node's rollup is complete before it is added to its parent
+    for node in sorted(nodes.values(), key=lambda node: node['depth'], reverse=True):
+        node['subtasks'].sort(key=lambda child: child['id'])
+        parent = nodes.get(node['parent_task_id']) if node['depth'] > 0 else None
+        if parent is None:
+            roots.append(node)
+            continue
+        parent['subtasks'].append(node)
+        rollup = parent['descendants']
+        rollup['total'] += 1 + node['descendants']['total']
+        for key in ROLLUP_STATUSES.values():
+            rollup[key] += node['descendants'][key]
+        status_key = ROLLUP_STATUSES.get(node['status'])
+        if status_key:
+            rollup[status_key] += 1
+    roots.sort(key=lambda node: node['id'])
+    return roots
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import httpx
+
+from common import APP_DIR, RESET_TABLES, free_port, percentiles, start_server, stop_server, write_results
+from fake_yougile import Workspace
+
+SEED_PAGE_SIZE = 10000
+BATCH_SIZE = 100
+
+
+async def seed(workspace, start, stop):
+    # Данные пишутся теми же функциями, что и при синхронизации, но без HTTP
+    from sqlalchemy import text
+
+    from databases import AsyncDatabase, create_engine
+    from migrations import migrate
+    from parser_yougile import (
+        employee_record, employees_processing, project_record, projects_processing, task_record, tasks_processing
+    )
+
+    def records(entity, limit, offset, record):
+        return {'content': [record(item) for item in workspace.page(entity, limit, offset)['content']]}
+
+    engine = create_engine()
+    try:
+        if start == 0:
+            await migrate(engine)
+            async with engine.begin() as conn:
+                await conn.execute(text(f"TRUNCATE {', '.join(RESET_TABLES)} CASCADE"))
+        async with AsyncDatabase(engine) as db:
+            if start == 0:
+                await employees_processing(db, records('users', workspace.users, 0, employee_record))
+                await projects_processing(db, records('projects', workspace.projects, 0, project_record))
+            for offset in range(start, stop, SEED_PAGE_SIZE):
+                await tasks_processing(
+                    db, records('tasks', min(SEED_PAGE_SIZE, stop - offset), offset, task_record)
+                )
+        # VACUUM также переносит pending list GIN-индексов в дерево, как это сделал бы autovacuum
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+            await conn.execute(text("VACUUM ANALYZE"))
+    finally:
+        await engine.dispose()
+
+
+def endpoints(workspace):
+    # (имя, метод, функция, возвращающая путь или пару (путь, тело JSON) для случайного ключа).
+    # Поток /changes/stream и приём вебхуков не измеряются: первый не завершается, второй только пишет в очередь
+    group = 1 + workspace.subtasks
+
+    def sample(rnd, prefix, count, suffix=''):
+        return [f'{prefix}{i}{suffix}' for i in rnd.sample(range(count), min(BATCH_SIZE, count))]
+
+    return [
+        ('GET /tasks/', 'GET', lambda rnd: '/tasks/?limit=1000'),
+        ('GET /tasks/?status', 'GET', lambda rnd: '/tasks/?status=Active&limit=100'),
+        ('GET /tasks/?assigned_employee_id', 'GET',
+         lambda rnd: f'/tasks/?assigned_employee_id=user-{rnd.randrange(workspace.users)}&limit=100'),
+        ('POST /tasks/{id}', 'POST', lambda rnd: f'/tasks/task-{rnd.randrange(workspace.tasks)}'),
+        ('POST /tasks/assigned/{id}', 'POST',
+         lambda rnd: f'/tasks/assigned/user-{rnd.randrange(workspace.users)}'),
+        ('POST /tasks/email/{email}', 'POST',
+         lambda rnd: f'/tasks/email/user{rnd.randrange(workspace.users)}@example.com'),
+        ('POST /tasks/batch', 'POST',
+         lambda rnd: ('/tasks/batch', {'ids': sample(rnd, 'task-', workspace.tasks)})),
+        ('GET /tasks/tree', 'GET', lambda rnd: '/tasks/tree?limit=100'),
+        ('GET /tasks/{id}/tree', 'GET',
+         lambda rnd: f'/tasks/task-{rnd.randrange(workspace.roots) * group}/tree'),
+        ('GET /tasks/search', 'GET',
+         lambda rnd: f'/tasks/search?q=task+{rnd.randrange(workspace.tasks)}&limit=20'),
+        ('GET /tasks/search?status', 'GET',
+         lambda rnd: f'/tasks/search?q=task+{rnd.randrange(workspace.tasks)}&status=Active&limit=20'),
+        ('GET /employees/', 'GET', lambda rnd: '/employees/?limit=1000'),
+        ('POST /employees/{email}', 'POST',
+         lambda rnd: f'/employees/user{rnd.randrange(workspace.users)}@example.com'),
+        ('POST /employees/service_identity/{email}', 'POST',
+         lambda rnd: f'/employees/service_identity/user{rnd.randrange(workspace.users)}@example.com'),
+        ('POST /employees/batch', 'POST',
+         lambda rnd: ('/employees/batch', {'emails': sample(rnd, 'user', workspace.users, '@example.com')})),
+        ('GET /employees/{email}/profile', 'GET',
+         lambda rnd: f'/employees/user{rnd.randrange(workspace.users)}@example.com/profile'),
+        ('GET /employees/service_links', 'GET', lambda rnd: '/employees/service_links'),
+        ('GET /projects/', 'GET', lambda rnd: '/projects/?limit=1000'),
+        ('GET /projects/search', 'GET',
+         lambda rnd: f'/projects/search?q=project+{rnd.randrange(workspace.projects)}&limit=20'),
+        ('POST /projects/{id}', 'POST', lambda rnd: f'/projects/project-{rnd.randrange(workspace.projects)}'),
+        ('POST /projects/batch', 'POST',
+         lambda rnd: ('/projects/batch', {'ids': sample(rnd, 'project-', workspace.projects)})),
+        ('GET /stats/tasks', 'GET', lambda rnd: '/stats/tasks'),
+        ('GET /stats/employees', 'GET', lambda rnd: '/stats/employees'),
+        ('GET /stats/employees/{email}', 'GET',
+         lambda rnd: f'/stats/employees/user{rnd.randrange(workspace.users)}@example.com'),
+        ('GET /stats/project_members', 'GET', lambda rnd: '/stats/project_members'),
+        ('GET /stats/project_members/{id}', 'GET',
+         lambda rnd: f'/stats/project_members/project-{rnd.randrange(workspace.projects)}'),
+        *[
+            (f'GET /export/{entity}?format={format}', 'GET', lambda rnd, path=f'/export/{entity}?format={format}': path)
+            for entity in ('tasks', 'employees', 'projects', 'project_members', 'service_links')
+            for format in ('ndjson', 'csv', 'parquet')
+        ],
+    ]
+
+
+async def load(client, method, request_for, requests, concurrency, seed_value):
+    rnd = random.Random(seed_value)
+    planned = [request_for(rnd) for _ in range(requests)]
+    planned = [request if isinstance(request, tuple) else (request, None) for request in planned]
+    concurrency = min(concurrency, requests)
+    latencies = []
+    errors = 0
+
+    async def worker(worker_requests):
+        nonlocal errors
+        for path, body in worker_requests:
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    async with asyncio.TaskGroup() as group:
+        for i in range(concurrency):
+            group.create_task(worker(planned[i::concurrency]))
+    duration = time.perf_counter() - started
+
+    result = {key: round(value * 1000, 2) for key, value in percentiles(latencies).items()}
+    result.update(requests=requests, errors=errors, requests_per_second=round(requests / duration, 1))
+    return result
+
+
+async def run_load(base_url, token, workspace, args):
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    headers = {'Authorization': f'Bearer {token}'}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60.0) as client:
+        for number, (name, method, request_for) in enumerate(endpoints(workspace)):
+            if args.only and not any(part in name for part in args.only):
+                continue
+            # Выгрузка отдаёт всю таблицу, поэтому для неё запросов меньше
+            requests = min(args.requests, args.export_requests) if name.startswith('GET /export/') else args.requests
+            # Прогрев: пул соединений, кеш планов и страниц Postgres
+            await load(client, method, request_for, min(args.concurrency, requests), args.concurrency, -number)
+            results[name] = await load(client, method, request_for, requests, args.concurrency, number)
+            row = results[name]
+            print(f"  {name:<44} p50 {row['p50']:8.2f} ms  p95 {row['p95']:8.2f} ms  p99 {row['p99']:8.2f} ms  "
+                  f"{row['requests_per_second']:8.1f} rps  errors {row['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP load benchmark of the API routers')
+    parser.add_argument('--tasks', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='total task counts, seeded incrementally')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--members', type=int, default=20, help='members per project')
+    parser.add_argument('--subtasks', type=int, default=2, help='subtasks per top-level task')
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--export-requests', type=int, default=10, help='requests per export endpoint')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache enabled')
+    parser.add_argument('--only', nargs='+', help='run endpoints whose name contains any of these strings')
+    parser.add_argument('--output', help='results file, benchmarks/results/ by default')
+    args = parser.parse_args()
+
+    token = os.getenv('API_TOKEN') or 'benchmark'
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = {'API_TOKEN': token}
+    if not args.cache:
+        # Иначе измеряются попадания в кеш ответов, а не запросы к базе
+        env['RESPONSE_CACHE_MAX_BYTES'] = '0'
+
+    results = []
+    seeded = 0
+    for total in sorted(args.tasks):
+        roots = -(-total // (1 + args.subtasks))
+        workspace = Workspace(args.users, args.projects, args.members, roots, args.subtasks)
+        started = time.perf_counter()
+        asyncio.run(seed(workspace, seeded, workspace.tasks))
+        print(f"{workspace.tasks} tasks seeded in {time.perf_counter() - started:.1f}s")
+        seeded = workspace.tasks
+
+        server = start_server([
+            '-m', 'uvicorn', 'main:app', '--port', str(port), '--workers', str(args.workers), '--log-level', 'warning'
+        ], f'{base_url}/docs', cwd=APP_DIR, env=env)
+        try:
+            endpoint_results = asyncio.run(run_load(base_url, token, workspace, args))
+        finally:
+            stop_server(server)
+        results.append({'tasks': workspace.tasks, 'endpoints': endpoint_results})
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    write_results('api', config, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
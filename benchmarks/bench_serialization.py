@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+from datetime import date
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from common import write_results
+from models import Task, TaskList
+
+warnings.simplefilter('ignore', DeprecationWarning)
+
+FIELDS = (
+    'id', 'name', 'status', 'start_date', 'end_date', 'deadline', 'assigned_employee_id', 'parent_task_id'
+)
+
+
+def make_rows(count):
+    return [
+        (f'task-{i}', f'Task {i}', 'Active', date(2024, 1, 1), None, date(2024, 2, 1), f'user-{i % 100}', None)
+        for i in range(count)
+    ]
+
+
+def orm_path(rows):
+    # Previous handler: ORM objects -> from_orm per row -> TaskList -> response_model validation -> json
+    objects = [SimpleNamespace(**dict(zip(FIELDS, row))) for row in rows]
+    result = TaskList(tasks=[Task.from_orm(task) for task in objects])
+    validated = TypeAdapter(TaskList).validate_python(result, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated), separators=(',', ':')).encode()
+
+
+def rows_path(rows):
+    # Current handler: projected row tuples -> dicts -> orjson
+    return orjson.dumps({'tasks': [dict(zip(FIELDS, row)) for row in rows], 'next_cursor': None})
+
+
+def measure(func, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare list response serialization paths')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='results file, benchmarks/results/ by default')
+    args = parser.parse_args()
+
+    results = []
+    for count in args.rows:
+        rows = make_rows(count)
+        orm_time, orm_body = measure(orm_path, rows, args.repeat)
+        rows_time, rows_body = measure(rows_path, rows, args.repeat)
+        assert json.loads(orm_body)['tasks'] == json.loads(rows_body)['tasks']
+        results.append({
+            'rows': count,
+            'orm_seconds': round(orm_time, 6),
+            'rows_seconds': round(rows_time, 6),
+            'speedup': round(orm_time / rows_time, 1)
+        })
+        print(f"{count:>8} rows: orm {orm_time * 1000:9.1f} ms, rows {rows_time * 1000:8.1f} ms, "
+              f"x{orm_time / rows_time:.1f}")
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    write_results('serialization', config, results, args.output)
+    return results
+
+
+if __name__ == '__main__':
+    main()
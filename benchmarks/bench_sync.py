@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common import RESET_TABLES, ROOT_DIR, free_port, start_server, stop_server, write_results
+
+
+def configure_client(base_url):
+    # Настройки клиента читаются при импорте yougile, поэтому задаются до него
+    os.environ['YOUGILE_BASE_URL'] = base_url
+    os.environ.setdefault('YOUGILE_API_KEY', 'benchmark')
+    os.environ.setdefault('YOUGILE_RATE_LIMIT', '100000')
+
+
+async def reset_database():
+    from sqlalchemy import text
+
+    from databases import create_engine
+    from migrations import migrate
+
+    engine = create_engine()
+    try:
+        await migrate(engine)
+        async with engine.begin() as conn:
+            await conn.execute(text(f"TRUNCATE {', '.join(RESET_TABLES)} CASCADE"))
+    finally:
+        await engine.dispose()
+
+
+async def run(args, rows):
+    from parser_yougile import process_data
+
+    if args.reset:
+        await reset_database()
+    results = []
+    for run_number in range(1, args.runs + 1):
+        # Первый прогон на пустой базе пишет всё, последующие проверяют инкрементальный режим
+        started = time.perf_counter()
+        await process_data()
+        duration = time.perf_counter() - started
+        # ru_maxrss в килобайтах на Linux; пик за всё время процесса, включая предыдущие прогоны
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        results.append({
+            'run': run_number,
+            'seconds': round(duration, 3),
+            'rows': rows,
+            'rows_per_second': round(rows / duration, 1),
+            'peak_rss_mb': round(peak_rss, 1),
+        })
+        print(f"run {run_number}: {rows} rows in {duration:.2f}s, {rows / duration:,.0f} rows/s, "
+              f"peak RSS {peak_rss:.0f} MB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end process_data benchmark against the fake YouGile API')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--members', type=int, default=20, help='members per project')
+    parser.add_argument('--tasks', type=int, default=30000, help='top-level tasks')
+    parser.add_argument('--subtasks', type=int, default=2, help='subtasks per top-level task')
+    parser.add_argument('--description', type=int, default=1000, help='task description length')
+    parser.add_argument('--runs', type=int, default=2)
+    parser.add_argument('--reset', action='store_true',
+                        help='truncate synced tables and sync state before the first run')
+    parser.add_argument('--output', help='results file, benchmarks/results/ by default')
+    args = parser.parse_args()
+
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}/api-v2'
+    server = start_server([
+        os.path.join('benchmarks', 'fake_yougile.py'), '--port', str(port),
+        '--users', str(args.users), '--projects', str(args.projects), '--members', str(args.members),
+        '--tasks', str(args.tasks), '--subtasks', str(args.subtasks),
+        '--description', str(args.description),
+    ], f'{base_url}/users?limit=1', cwd=ROOT_DIR)
+    try:
+        configure_client(base_url)
+        rows = args.users + args.projects + args.tasks * (1 + args.subtasks)
+        results = asyncio.run(run(args, rows))
+    finally:
+        stop_server(server)
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    write_results('sync', config, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
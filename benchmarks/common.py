@@ -0,0 +1,91 @@
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIR = os.path.join(ROOT_DIR, 'app')
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+# Таблицы, которые очищаются перед прогоном, в порядке зависимостей
+RESET_TABLES = (
+    'project_members', 'tasks', 'deleted_tasks', 'projects', 'service_identities', 'employees',
+    'sync_row_hashes', 'sync_watermarks',
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, url, cwd=ROOT_DIR, env=None, timeout=30.0):
+    # Сервер запускается отдельным процессом, чтобы не делить event loop с измеряемым кодом
+    process = subprocess.Popen([sys.executable, *args], cwd=cwd, env={**os.environ, **(env or {})})
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}: {' '.join(args)}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server did not start in {timeout:.0f}s: {' '.join(args)}")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    ordered = sorted(samples)
+    if not ordered:
+        return {f'p{point}': None for point in points}
+    return {
+        f'p{point}': ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))]
+        for point in points
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name, config, results, output=None):
+    # Результаты сохраняются вместе с ревизией и параметрами, чтобы прогоны можно было сравнивать
+    started_at = datetime.now(timezone.utc)
+    payload = {
+        'benchmark': name,
+        'started_at': started_at.isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{started_at:%Y%m%dT%H%M%S}.json")
+    with open(output, 'w') as file:
+        json.dump(payload, file, indent=2, default=str)
+    print(f"Results written to {output}")
+    return output
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import os
+
+import uvicorn
+from fastapi import FastAPI, Query
+
+# Синтетическая замена YouGile API v2 для бенчмарков. Записи вычисляются по индексу,
+# поэтому сервер не держит данные в памяти и одинаково отвечает между запусками.
+DAY_MS = 24 * 60 * 60 * 1000
+BASE_TIMESTAMP = 1704067200000  # 2024-01-01
+
+
+class Workspace:
+    def __init__(self, users=100, projects=20, members=10, tasks=10000, subtasks=2, description=0,
+                 prefix='', latency=0.0):
+        self.users = users
+        self.projects = projects
+        self.members = min(members, users)
+        self.roots = tasks
+        self.subtasks = subtasks
+        # Каждая корневая задача идёт в списке вместе со своими подзадачами
+        self.tasks = tasks * (1 + subtasks)
+        # Длина описания задачи: настоящие задачи приходят с текстом, который парсер не сохраняет
+        self.description = description
+        # Несколько серверов изображают разные пространства: ID проектов и задач в YouGile глобальные,
+        # а пользователи с одинаковыми ID и почтой есть в каждом
+        self.prefix = prefix
+        # Задержка ответа в секундах, чтобы изобразить медленное пространство
+        self.latency = latency
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            users=int(os.getenv('FAKE_YOUGILE_USERS', 100)),
+            projects=int(os.getenv('FAKE_YOUGILE_PROJECTS', 20)),
+            members=int(os.getenv('FAKE_YOUGILE_MEMBERS', 10)),
+            tasks=int(os.getenv('FAKE_YOUGILE_TASKS', 10000)),
+            subtasks=int(os.getenv('FAKE_YOUGILE_SUBTASKS', 2)),
+            description=int(os.getenv('FAKE_YOUGILE_DESCRIPTION', 0)),
+            prefix=os.getenv('FAKE_YOUGILE_PREFIX', ''),
+            latency=float(os.getenv('FAKE_YOUGILE_LATENCY', 0)),
+        )
+
+    def count(self, entity):
+        return {'users': self.users, 'projects': self.projects, 'tasks': self.tasks}[entity]
+
+    def user(self, i):
+        return {'id': f'user-{i}', 'realName': f'User {i}', 'email': f'user{i}@example.com'}
+
+    def project(self, i):
+        users = {f'user-{(i * self.members + j) % self.users}': 'worker' for j in range(self.members)}
+        return {'id': f'{self.prefix}project-{i}', 'title': f'Project {i}', 'users': users}
+
+    def task(self, i):
+        group = 1 + self.subtasks
+        task = {
+            'id': f'{self.prefix}task-{i}',
+            'title': f'Task {i}',
+            'archived': i % 10 == 9,
+            'completed': i % 3 == 2,
+            'timestamp': BASE_TIMESTAMP + (i % 365) * DAY_MS,
+            'assigned': [f'user-{i % self.users}'],
+            'columnId': f'column-{i % 50}',
+            'createdBy': f'user-{(i * 7) % self.users}',
+        }
+        if self.description:
+            task['description'] = (f'Description of task {i}. ' * self.description)[:self.description]
+        if i % group == 0:
+            task['subtasks'] = [f'{self.prefix}task-{i + j}' for j in range(1, group)]
+        if task['completed']:
+            task['completedTimestamp'] = task['timestamp'] + 3 * DAY_MS
+        if i % 4 == 0:
+            task['deadline'] = {'deadline': task['timestamp'] + 14 * DAY_MS}
+        return task
+
+    def page(self, entity, limit, offset):
+        total = self.count(entity)
+        build = {'users': self.user, 'projects': self.project, 'tasks': self.task}[entity]
+        content = [build(i) for i in range(offset, min(total, offset + limit))]
+        return {
+            'paging': {'count': len(content), 'limit': limit, 'offset': offset, 'next': offset + limit < total},
+            'content': content
+        }
+
+
+def create_app(workspace):
+    app = FastAPI()
+
+    @app.get('/api-v2/{entity}')
+    async def list_entities(entity: str, limit: int = Query(50, le=1000), offset: int = 0):
+        if workspace.latency:
+            await asyncio.sleep(workspace.latency)
+        return workspace.page(entity, limit, offset)
+
+    return app
+
+
+app = create_app(Workspace.from_env())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local fake YouGile API for benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--members', type=int, default=10, help='members per project')
+    parser.add_argument('--tasks', type=int, default=10000, help='top-level tasks')
+    parser.add_argument('--subtasks', type=int, default=2, help='subtasks per top-level task')
+    parser.add_argument('--description', type=int, default=0, help='task description length')
+    parser.add_argument('--prefix', default='', help='prefix of project and task ids')
+    parser.add_argument('--latency', type=float, default=0.0, help='response delay in seconds')
+    args = parser.parse_args()
+    workspace = Workspace(
+        args.users, args.projects, args.members, args.tasks, args.subtasks, args.description,
+        args.prefix, args.latency
+    )
+    uvicorn.run(create_app(workspace), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
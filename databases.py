@@ -1,8 +1,11 @@
 import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, backref
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Table
+from sqlalchemy.orm import sessionmaker, relationship, backref, foreign
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, ForeignKey, Date, DateTime, LargeBinary, Table, Index, select, update, text, func, bindparam, any_, literal_column, DDL, event
+from sqlalchemy.dialects.postgresql import insert, ARRAY, JSONB
 
 from dotenv import load_dotenv, find_dotenv
 
@@ -10,10 +13,34 @@ load_dotenv(find_dotenv())
 
 Base = declarative_base()
 
+# Количество строк в одном INSERT ... SELECT FROM unnest(...)
+UPSERT_CHUNK_SIZE = 10000
+
+# Канал LISTEN/NOTIFY, по которому API узнаёт о новых данных
+SYNC_CHANNEL = 'kanban_sync'
+# Канал, по которому API узнаёт о новых записях в change_events
+CHANGES_CHANNEL = 'kanban_changes'
+# Сколько последних событий хранится для переподключающихся клиентов
+CHANGE_LOG_RETENTION = int(os.getenv('CHANGE_LOG_RETENTION', 100000))
+# Канал, по которому API будит обработчик вебхуков YouGile
+WEBHOOK_CHANNEL = 'kanban_webhooks'
+# Сколько дней хранятся задачи, удалённые в YouGile
+DELETED_TASKS_RETENTION_DAYS = float(os.getenv('DELETED_TASKS_RETENTION_DAYS', 90))
+# Все, кто пишет в tasks, берут эту блокировку: уникальность id между секциями проверяет не база
+TASKS_WRITE_LOCK = "SELECT pg_advisory_xact_lock(hashtext('tasks'))"
+# Пространства синхронизируются параллельно, а агрегаты пересчитываются целиком: по одному
+TASK_STATS_LOCK = "SELECT pg_advisory_xact_lock(hashtext('task_stats'))"
+# Все, кто пишет в change_events, берут эту блокировку до вставки: seq выдаётся при вставке, а виден
+# после фиксации, и без неё читатель, ушедший за seq 101, не увидел бы позже зафиксированный seq 100
+CHANGE_LOG_LOCK = "SELECT pg_advisory_xact_lock(hashtext('change_events'))"
+# Сколько дней хранится история запусков синхронизации
+SYNC_RUNS_RETENTION_DAYS = float(os.getenv('SYNC_RUNS_RETENTION_DAYS', 30))
+
 # Модели данных
 project_members = Table('project_members', Base.metadata,
-    Column('project_id', String, ForeignKey('projects.id')),
-    Column('service_user_id', String, ForeignKey('service_identities.service_user_id'))
+    Column('project_id', String, ForeignKey('projects.id'), primary_key=True),
+    Column('service_user_id', String, ForeignKey('service_identities.service_user_id'), primary_key=True),
+    Index('ix_project_members_service_user_id', 'service_user_id')
 )
 
 class Project(Base):
@@ -25,7 +52,7 @@ class Project(Base):
 class ServiceIdentity(Base):
     __tablename__ = 'service_identities'
     service_user_id = Column(String, primary_key=True)
-    employee_email = Column(String, ForeignKey('employees.email'))
+    employee_email = Column(String, ForeignKey('employees.email'), index=True)
     service_name = Column(String)
     projects = relationship('Project', secondary=project_members, back_populates="members")
     employee = relationship("Employee", back_populates="service_identities")
@@ -41,28 +68,197 @@ class Employee(Base):
 
 
 
+# Задачи секционированы по статусу: активные лежат в tasks_active, завершённые и архивные -
+# в tasks_archive. Ключ секционирования обязан входить в первичный ключ, поэтому ключ (id, status),
+# а внешнего ключа parent_task_id -> tasks.id нет.
 class Task(Base):
     __tablename__ = 'tasks'
     id = Column(String, primary_key=True)
     assigned_employee_id = Column(String, ForeignKey('service_identities.service_user_id'))
-    parent_task_id = Column(String, ForeignKey('tasks.id'), nullable=True)
+    parent_task_id = Column(String, nullable=True)
     name = Column(String)
-    status = Column(String)
+    status = Column(String, primary_key=True)
     start_date = Column(Date, nullable=True)
     end_date = Column(Date, nullable=True)
     deadline = Column(Date, nullable=True)
 
     assigned_service_identity = relationship("ServiceIdentity", back_populates="tasks")
-    subtasks = relationship("Task", backref=backref('parent', remote_side=[id]))
+    subtasks = relationship(
+        "Task", primaryjoin=lambda: Task.id == foreign(Task.parent_task_id),
+        backref=backref('parent', remote_side=lambda: [Task.id])
+    )
+
+    __table_args__ = (
+        Index('ix_tasks_status_id', 'status', 'id'),
+        Index('ix_tasks_assigned_employee_id_id', 'assigned_employee_id', 'id'),
+        Index('ix_tasks_parent_task_id_id', 'parent_task_id', 'id'),
+        Index('ix_tasks_deadline', 'deadline'),
+        Index('ix_tasks_start_date', 'start_date'),
+        Index('ix_tasks_active_deadline', 'deadline', postgresql_where=text("status = 'Active'")),
+        Index('ix_tasks_root_id', 'id', postgresql_where=text("parent_task_id IS NULL")),
+        {'postgresql_partition_by': 'LIST (status)'},
+    )
+
+
+event.listen(Task.__table__, 'after_create', DDL(
+    "CREATE TABLE IF NOT EXISTS tasks_active PARTITION OF tasks FOR VALUES IN ('Active')"
+))
+event.listen(Task.__table__, 'after_create', DDL(
+    "CREATE TABLE IF NOT EXISTS tasks_archive PARTITION OF tasks DEFAULT"
+))
+
+
+# Задачи, которых больше нет в YouGile. Возвращаются в tasks, если задача появится снова.
+class DeletedTask(Base):
+    __tablename__ = 'deleted_tasks'
+    id = Column(String, primary_key=True)
+    assigned_employee_id = Column(String)
+    parent_task_id = Column(String)
+    name = Column(String)
+    status = Column(String)
+    start_date = Column(Date)
+    end_date = Column(Date)
+    deadline = Column(Date)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+
+def name_search_vector(column):
+    # То же выражение используется в запросах поиска API, иначе индекс не применяется
+    return func.to_tsvector(literal_column("'simple'"), func.coalesce(column, literal_column("''")))
+
+
+# Выражение не ссылается на таблицу напрямую, поэтому индексы привязываются к ней явно
+Task.__table__.append_constraint(
+    Index('ix_tasks_name_search', name_search_vector(Task.name), postgresql_using='gin')
+)
+Project.__table__.append_constraint(
+    Index('ix_projects_name_search', name_search_vector(Project.name), postgresql_using='gin')
+)
+
+
+# Агрегаты по задачам, пересчитываются после каждой синхронизации.
+# scope: 'all' (key пустой), 'employee' (key - email) или 'project_members' (key - id проекта)
+class TaskStatusCount(Base):
+    __tablename__ = 'task_status_counts'
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+# Активные задачи по дням дедлайна: просроченные и ближайшие считаются суммой по диапазону дат
+class TaskDeadlineCount(Base):
+    __tablename__ = 'task_deadline_counts'
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    deadline = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+# У задач нет ссылки на проект, поэтому для проекта считаются все задачи его участников, в том числе
+# из других проектов; участник нескольких проектов учитывается в каждом. Это не статистика проекта.
+TASK_STATS_SCOPES = """
+    SELECT 'all' AS scope, '' AS key, t.* FROM tasks t
+    UNION ALL
+    SELECT 'employee', si.employee_email, t.* FROM tasks t
+    JOIN service_identities si ON si.service_user_id = t.assigned_employee_id
+    WHERE si.employee_email IS NOT NULL
+    UNION ALL
+    SELECT 'project_members', pm.project_id, t.* FROM tasks t
+    JOIN project_members pm ON pm.service_user_id = t.assigned_employee_id
+"""
+REFRESH_TASK_STATS = [
+    "DELETE FROM task_status_counts",
+    f"INSERT INTO task_status_counts (scope, key, status, count) "
+    f"SELECT scope, key, status, count(*) FROM ({TASK_STATS_SCOPES}) s "
+    f"WHERE status IS NOT NULL GROUP BY scope, key, status",
+    "DELETE FROM task_deadline_counts",
+    f"INSERT INTO task_deadline_counts (scope, key, deadline, count) "
+    f"SELECT scope, key, deadline, count(*) FROM ({TASK_STATS_SCOPES}) s "
+    f"WHERE status = 'Active' AND deadline IS NOT NULL GROUP BY scope, key, deadline",
+]
+
+
+# Состояние инкрементальной синхронизации
+class SyncWatermark(Base):
+    __tablename__ = 'sync_watermarks'
+    entity = Column(String, primary_key=True)
+    synced_at = Column(DateTime(timezone=True))
+    full_synced_at = Column(DateTime(timezone=True), nullable=True)
+    rows_new = Column(Integer, default=0)
+    rows_changed = Column(Integer, default=0)
+    rows_unchanged = Column(Integer, default=0)
+
+class SyncRowHash(Base):
+    __tablename__ = 'sync_row_hashes'
+    entity = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    hash = Column(LargeBinary, nullable=False)
+    # Время синхронизации, в которой запись последний раз пришла из YouGile
+    seen_at = Column(DateTime(timezone=True), nullable=True)
+
+# Очередь вебхуков YouGile: API только сохраняет событие, применяет его парсер
+class WebhookEvent(Base):
+    __tablename__ = 'webhook_events'
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)
+    action = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    # Имя пространства из workspaces.yaml, NULL - пространство без префикса
+    workspace = Column(String, nullable=True)
+    received_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+# Журнал изменений для GET /changes/stream, seq - возобновляемый номер события
+class ChangeEvent(Base):
+    __tablename__ = 'change_events'
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)
+    action = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+# История запусков синхронизации. stages - выполненные этим запуском этапы и их длительность
+# в секундах, skipped - пропущенные этапы и причина: locked (этап выполняет другая реплика)
+# или fresh (этап недавно выполнен)
+class SyncRun(Base):
+    __tablename__ = 'sync_runs'
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    workspace = Column(String, nullable=False)
+    replica = Column(String, nullable=False)
+    # running, success, skipped, failed или cancelled
+    status = Column(String, nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    stages = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    skipped = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    error = Column(Text, nullable=True)
+    __table_args__ = (Index('ix_sync_runs_workspace_started_at', 'workspace', 'started_at'),)
+
+class SyncGeneration(Base):
+    __tablename__ = 'sync_generation'
+    id = Column(Integer, primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True))
+
+def create_engine():
+    return create_async_engine(
+        f"postgresql+asyncpg://{os.getenv('DATABASE_USERNAME')}:{os.getenv('DATABASE_PASSWORD')}@"
+        f"{os.getenv('DATABASE_IP')}:{os.getenv('DATABASE_PORT')}/"
+        f"{os.getenv('DATABASE_NAME')}",
+        echo=False,
+        pool_size=int(os.getenv('DATABASE_POOL_SIZE', 10)),
+        max_overflow=int(os.getenv('DATABASE_MAX_OVERFLOW', 20)),
+        pool_pre_ping=os.getenv('DATABASE_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        pool_recycle=int(os.getenv('DATABASE_POOL_RECYCLE', 1800)),
+    )
+
 
 class AsyncDatabase:
-    def __init__(self):
-        self.engine = create_async_engine(
-            f"postgresql+asyncpg://{os.getenv('DATABASE_USERNAME')}:{os.getenv('DATABASE_PASSWORD')}@"
-            f"{os.getenv('DATABASE_IP')}:{os.getenv('DATABASE_PORT')}/"
-            f"{os.getenv('DATABASE_NAME')}",
-            echo=False
-        )
+    # engine может быть и открытым соединением: тогда все транзакции сессии идут через него,
+    # и сессионные advisory-блокировки живут, пока соединение не закрыто
+    def __init__(self, engine=None):
+        self._owns_engine = engine is None
+        self.engine = engine if engine is not None else create_engine()
         self._session = sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
 
     async def __aenter__(self):
@@ -71,34 +267,378 @@ class AsyncDatabase:
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.session.close()
+        if self._owns_engine:
+            await self.engine.dispose()
+
+    async def _upsert(self, table, rows, index_elements, do_nothing=False):
+        # Повторяющиеся ключи в одном INSERT ... ON CONFLICT недопустимы, оставляем последнюю версию
+        rows = {tuple(row[c] for c in index_elements): row for row in rows}
+        if not rows:
+            return 0
+        # Этапы пишут пересекающиеся ключи параллельно; вставка в порядке ключа не даёт
+        # транзакциям ждать блокировок уникального индекса друг друга (deadlock)
+        rows = [rows[key] for key in sorted(rows)]
+        columns = list(rows[0].keys())
+        # Каждая колонка передаётся одним массивом, поэтому запрос компилируется один раз
+        source = func.unnest(
+            *[bindparam(c, type_=ARRAY(table.c[c].type)) for c in columns]
+        ).table_valued(*columns).render_derived()
+        stmt = insert(table).from_select(columns, select(*[source.c[c] for c in columns]))
+        update_columns = [c for c in columns if c not in index_elements]
+        if do_nothing or not update_columns:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={c: stmt.excluded[c] for c in update_columns}
+            )
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+            await self.session.execute(stmt, {c: [row[c] for row in chunk] for c in columns})
+        return len(rows)
 
-    async def add_update_task(self, task):
-        try:
-            await self.session.merge(task)
-        except Exception as e:
-            print(e)
+    async def upsert_employees(self, employees):
+        count = await self._upsert(Employee.__table__, employees, ['email'])
         await self.session.commit()
+        return count
 
-    async def add_update_employee(self, employee):
-        try:
-            await self.session.merge(employee)
-        except Exception as e:
-            print(e)
+    async def upsert_service_identities(self, service_identities):
+        count = await self._upsert(ServiceIdentity.__table__, service_identities, ['service_user_id'])
         await self.session.commit()
+        return count
 
-    async def add_update_project(self, project):
-        try:
-            await self.session.merge(project)
-        except Exception as e:
-            print(e)
+    async def ensure_service_identities(self, user_ids, service_name=None):
+        rows = [{'service_user_id': user_id, 'service_name': service_name} for user_id in user_ids if user_id]
+        count = await self._upsert(ServiceIdentity.__table__, rows, ['service_user_id'], do_nothing=True)
         await self.session.commit()
+        return count
+
+    async def get_identity_emails(self, user_ids):
+        result = await self.session.execute(
+            select(ServiceIdentity.service_user_id, ServiceIdentity.employee_email)
+            .where(ServiceIdentity.service_user_id == any_(bindparam('ids', user_ids, type_=ARRAY(String))))
+            .where(ServiceIdentity.employee_email.isnot(None))
+        )
+        return dict(result.all())
+
+    async def upsert_projects(self, projects):
+        count = await self._upsert(Project.__table__, projects, ['id'])
+        await self.session.commit()
+        return count
+
+    async def sync_project_members(self, members, service_name=None):
+        # members: {project_id: [service_user_id, ...]} с полным составом каждого проекта.
+        # Разница с project_members считается в базе, пишутся только добавления и удаления.
+        # Участники, которых ещё нет в service_identities, создаются с service_name пространства,
+        # в порядке ключа, как и в _upsert.
+        if not members:
+            return 0, 0
+        project_ids = []
+        user_ids = []
+        for project_id, project_user_ids in members.items():
+            for user_id in set(project_user_ids):
+                project_ids.append(project_id)
+                user_ids.append(user_id)
+        project_ids_param = bindparam('project_ids', type_=ARRAY(String))
+        user_ids_param = bindparam('user_ids', type_=ARRAY(String))
+        synced_param = bindparam('synced_project_ids', type_=ARRAY(String))
+
+        await self.session.execute(text(
+            "INSERT INTO service_identities (service_user_id, service_name) "
+            "SELECT user_id, :service_name FROM unnest(:user_ids) WITH ORDINALITY AS u(user_id, n) ORDER BY n "
+            "ON CONFLICT (service_user_id) DO UPDATE SET service_name = EXCLUDED.service_name "
+            "WHERE service_identities.service_name IS NULL"
+        ).bindparams(user_ids_param), {'user_ids': sorted(set(user_ids)), 'service_name': service_name})
+        deleted = await self.session.execute(text(
+            "DELETE FROM project_members pm "
+            "WHERE pm.project_id = ANY(:synced_project_ids) AND NOT EXISTS ("
+            "    SELECT 1 FROM unnest(:project_ids, :user_ids) AS d(project_id, service_user_id) "
+            "    WHERE d.project_id = pm.project_id AND d.service_user_id = pm.service_user_id"
+            ")"
+        ).bindparams(project_ids_param, user_ids_param, synced_param), {
+            'project_ids': project_ids, 'user_ids': user_ids, 'synced_project_ids': list(members)
+        })
+        inserted = await self.session.execute(text(
+            "INSERT INTO project_members (project_id, service_user_id) "
+            "SELECT project_id, service_user_id FROM unnest(:project_ids, :user_ids) AS d(project_id, service_user_id) "
+            "ON CONFLICT DO NOTHING"
+        ).bindparams(project_ids_param, user_ids_param), {'project_ids': project_ids, 'user_ids': user_ids})
+        await self.session.commit()
+        return inserted.rowcount, deleted.rowcount
+
+    async def upsert_tasks(self, tasks, subtask_links=()):
+        await self.session.execute(text(TASKS_WRITE_LOCK))
+        tasks = list({row['id']: row for row in tasks}.values())
+        if tasks:
+            ids = [row['id'] for row in tasks]
+            ids_param = bindparam('ids', type_=ARRAY(String))
+            # Смена статуса переносит строку в другую секцию; UPDATE сохраняет parent_task_id,
+            # которого нет в строках задач
+            await self.session.execute(text(
+                "UPDATE tasks SET status = d.status FROM unnest(:ids, :statuses) AS d(id, status) "
+                "WHERE tasks.id = d.id AND tasks.status <> d.status"
+            ).bindparams(ids_param, bindparam('statuses', type_=ARRAY(String))), {
+                'ids': ids, 'statuses': [row['status'] for row in tasks]
+            })
+            await self.session.execute(
+                text("DELETE FROM deleted_tasks WHERE id = ANY(:ids)").bindparams(ids_param), {'ids': ids}
+            )
+        count = await self._upsert(Task.__table__, tasks, ['id', 'status'])
+        if subtask_links:
+            await self._link_subtasks(subtask_links)
+        await self.session.commit()
+        return count
+
+    async def _link_subtasks(self, subtask_links):
+        links = {link['id']: link['parent_task_id'] for link in subtask_links}
+        params = {'ids': list(links), 'parents': list(links.values())}
+        binds = (bindparam('ids', type_=ARRAY(String)), bindparam('parents', type_=ARRAY(String)))
+        await self.session.execute(text(
+            "UPDATE tasks SET parent_task_id = d.parent_task_id "
+            "FROM unnest(:ids, :parents) AS d(id, parent_task_id) "
+            "WHERE tasks.id = d.id AND tasks.parent_task_id IS DISTINCT FROM d.parent_task_id"
+        ).bindparams(*binds), params)
+        # Подзадача может прийти на более поздней странице: до этого хранится заготовка со ссылкой
+        # на родителя, а статус исправит upsert самой подзадачи
+        await self.session.execute(text(
+            "INSERT INTO tasks (id, status, parent_task_id) "
+            "SELECT d.id, 'Active', d.parent_task_id FROM unnest(:ids, :parents) AS d(id, parent_task_id) "
+            "WHERE NOT EXISTS (SELECT 1 FROM tasks WHERE tasks.id = d.id)"
+        ).bindparams(*binds), params)
 
-    async def add_update_service_identity(self, service_identity):
-        try:
-           await self.session.merge(service_identity)
-        except Exception as e:
-            print(e)
+    async def archive_tasks(self, ids):
+        # Удалённые в YouGile задачи переносятся в deleted_tasks, у их подзадач обнуляется родитель
+        if not ids:
+            return 0
+        await self.session.execute(text(TASKS_WRITE_LOCK))
+        result = await self.session.execute(text(
+            "WITH moved AS (DELETE FROM tasks WHERE id = ANY(:ids) RETURNING *), "
+            "orphaned AS ("
+            "    UPDATE tasks SET parent_task_id = NULL WHERE parent_task_id = ANY(:ids) AND NOT id = ANY(:ids) "
+            "    RETURNING id"
+            "), "
+            # Ссылки на родителя записываются заново, если задача или её родитель вернутся
+            "unlinked AS ("
+            "    DELETE FROM sync_row_hashes WHERE entity = 'subtask_links' "
+            "    AND (key = ANY(:ids) OR key IN (SELECT id FROM orphaned))"
+            ") "
+            "INSERT INTO deleted_tasks (id, assigned_employee_id, parent_task_id, name, status, "
+            "start_date, end_date, deadline) "
+            "SELECT id, assigned_employee_id, parent_task_id, name, status, start_date, end_date, deadline "
+            "FROM moved ON CONFLICT (id) DO UPDATE SET deleted_at = now()"
+        ).bindparams(bindparam('ids', type_=ARRAY(String))), {'ids': list(ids)})
+        return result.rowcount
+
+    async def purge_deleted_tasks(self):
+        result = await self.session.execute(text(
+            "DELETE FROM deleted_tasks WHERE deleted_at < now() - make_interval(days => :days)"
+        ), {'days': DELETED_TASKS_RETENTION_DAYS})
+        await self.session.commit()
+        return result.rowcount
+
+    async def try_advisory_lock(self, key):
+        # Сессионная блокировка переживает commit, поэтому сессия должна работать на своём соединении
+        result = await self.session.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"), {'key': key})
+        await self.session.commit()
+        return result.scalar()
+
+    async def wait_advisory_lock(self, key):
+        # Ждёт, пока блокировку отпустит тот, кто её держит
+        await self.session.execute(text("SELECT pg_advisory_lock(hashtext(:key))"), {'key': key})
+        await self.session.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {'key': key})
+        await self.session.commit()
+
+    async def advisory_unlock(self, key):
+        # Транзакция после ошибки могла остаться прерванной
+        await self.session.rollback()
+        await self.session.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {'key': key})
+        await self.session.commit()
+
+    async def start_sync_run(self, workspace, replica):
+        result = await self.session.execute(
+            insert(SyncRun).values(workspace=workspace, replica=replica, status='running').returning(SyncRun.id)
+        )
+        await self.session.commit()
+        return result.scalar()
+
+    async def record_sync_stage(self, run_id, stage, seconds=None, skipped=None):
+        column = SyncRun.skipped if skipped else SyncRun.stages
+        value = func.jsonb_build_object(stage, skipped or round(seconds, 3))
+        await self.session.execute(update(SyncRun).where(SyncRun.id == run_id).values({column: column.op('||')(value)}))
+        await self.session.commit()
+
+    async def finish_sync_run(self, run_id, status, error=None):
+        await self.session.execute(update(SyncRun).where(SyncRun.id == run_id).values(
+            status=status,
+            error=error,
+            finished_at=func.now(),
+            duration_seconds=func.extract('epoch', func.now() - SyncRun.started_at),
+        ))
+        await self.session.execute(text(
+            "DELETE FROM sync_runs WHERE started_at < now() - make_interval(days => :days)"
+        ), {'days': SYNC_RUNS_RETENTION_DAYS})
+        await self.session.commit()
+
+    async def stage_synced_since(self, workspace, stage, since):
+        # Этап уже выполнил запуск, начавшийся после since и не закончившийся ошибкой
+        result = await self.session.execute(select(
+            select(SyncRun.id).where(
+                SyncRun.workspace == workspace,
+                SyncRun.started_at >= since,
+                SyncRun.status.in_(('running', 'success')),
+                SyncRun.stages.has_key(stage),
+            ).exists()
+        ))
+        return result.scalar()
+
+    async def get_row_hashes(self, entity, keys):
+        result = await self.session.execute(
+            select(SyncRowHash.key, SyncRowHash.hash)
+            .where(SyncRowHash.entity == entity)
+            .where(SyncRowHash.key == any_(bindparam('keys', keys, type_=ARRAY(String))))
+        )
+        return dict(result.all())
+
+    async def upsert_row_hashes(self, entity, hashes, seen_at=None):
+        rows = [{'entity': entity, 'key': key, 'hash': value, 'seen_at': seen_at} for key, value in hashes.items()]
+        count = await self._upsert(SyncRowHash.__table__, rows, ['entity', 'key'])
+        await self.session.commit()
+        return count
+
+    async def forget_row_hashes(self, entity, keys):
+        if not keys:
+            return 0
+        result = await self.session.execute(text(
+            "DELETE FROM sync_row_hashes WHERE entity = :entity AND key = ANY(:keys)"
+        ).bindparams(bindparam('keys', type_=ARRAY(String))), {'entity': entity, 'keys': keys})
+        await self.session.commit()
+        return result.rowcount
+
+    async def record_changes(self, events):
+        # events: [(entity, action, key), ...]; порядок в списке становится порядком seq
+        if not events:
+            return 0
+        entities, actions, keys = (list(column) for column in zip(*events))
+        await self.session.execute(text(CHANGE_LOG_LOCK))
+        await self.session.execute(text(
+            "INSERT INTO change_events (entity, action, key) "
+            "SELECT entity, action, key FROM unnest(:entities, :actions, :keys) WITH ORDINALITY "
+            "AS e(entity, action, key, n) ORDER BY n"
+        ).bindparams(
+            bindparam('entities', type_=ARRAY(String)),
+            bindparam('actions', type_=ARRAY(String)),
+            bindparam('keys', type_=ARRAY(String)),
+        ), {'entities': entities, 'actions': actions, 'keys': keys})
+        await self._notify_changes()
+        await self.session.commit()
+        return len(events)
+
+    async def record_deletions(self, entities, synced_at):
+        # Записи, которых не было в полной синхронизации, начатой в synced_at, удалены в YouGile.
+        # Их хеши удаляются, чтобы при повторном появлении запись считалась новой.
+        # Строки удалённых задач уходят в deleted_tasks в той же транзакции.
+        # entities: {сущность в sync_row_hashes (с префиксом пространства): сущность в журнале}
+        await self.session.execute(text(CHANGE_LOG_LOCK))
+        result = await self.session.execute(text(
+            "WITH gone AS ("
+            "    DELETE FROM sync_row_hashes h USING unnest(:state_entities, :entities) AS e(state_entity, entity) "
+            "    WHERE h.entity = e.state_entity AND (h.seen_at IS NULL OR h.seen_at < :synced_at) "
+            "    RETURNING e.entity, h.key"
+            "), events AS ("
+            "    INSERT INTO change_events (entity, action, key) SELECT entity, 'deleted', key FROM gone"
+            ") "
+            "SELECT entity, key FROM gone"
+        ).bindparams(
+            bindparam('state_entities', type_=ARRAY(String)),
+            bindparam('entities', type_=ARRAY(String)),
+        ), {'state_entities': list(entities), 'entities': list(entities.values()), 'synced_at': synced_at})
+        gone = result.all()
+        if gone:
+            await self.archive_tasks([key for entity, key in gone if entity == 'tasks'])
+            await self._notify_changes()
+        await self.session.commit()
+        return len(gone)
+
+    async def record_deleted(self, entity, keys, state_entity=None):
+        # Удаление, о котором сообщил вебхук: хеши забываются, в журнал пишется событие deleted
+        if not keys:
+            return 0
+        keys_param = bindparam('keys', type_=ARRAY(String))
+        # Блокировка берётся первой: record_deletions удаляет те же хеши, уже держа её
+        await self.session.execute(text(CHANGE_LOG_LOCK))
+        await self.session.execute(text(
+            "DELETE FROM sync_row_hashes WHERE entity = :entity AND key = ANY(:keys)"
+        ).bindparams(keys_param), {'entity': state_entity or entity, 'keys': keys})
+        await self.session.execute(text(
+            "INSERT INTO change_events (entity, action, key) SELECT :entity, 'deleted', key FROM unnest(:keys) AS key"
+        ).bindparams(keys_param), {'entity': entity, 'keys': keys})
+        if entity == 'tasks':
+            await self.archive_tasks(keys)
+        await self._notify_changes()
+        await self.session.commit()
+        return len(keys)
+
+    async def get_webhook_events(self, limit):
+        result = await self.session.execute(select(WebhookEvent).order_by(WebhookEvent.id).limit(limit))
+        return result.scalars().all()
+
+    async def delete_webhook_events(self, ids):
+        await self.session.execute(
+            WebhookEvent.__table__.delete().where(WebhookEvent.id == any_(bindparam('ids', ids, type_=ARRAY(BigInteger))))
+        )
+        await self.session.commit()
+
+    async def trim_change_log(self):
+        result = await self.session.execute(text(
+            "DELETE FROM change_events WHERE seq <= (SELECT max(seq) FROM change_events) - :retention"
+        ), {'retention': CHANGE_LOG_RETENTION})
+        await self.session.commit()
+        return result.rowcount
+
+    async def _notify_changes(self):
+        # Уведомление уходит при фиксации транзакции вместе с событиями, в нём только последний seq
+        await self.session.execute(text(
+            "SELECT pg_notify(:channel, (SELECT coalesce(max(seq), 0) FROM change_events)::text)"
+        ), {'channel': CHANGES_CHANNEL})
+
+    async def get_watermarks(self):
+        result = await self.session.execute(select(SyncWatermark))
+        return {watermark.entity: watermark for watermark in result.scalars().all()}
+
+    async def set_watermark(self, entity, stats, full=False):
+        now = datetime.now(timezone.utc)
+        row = {
+            'entity': entity,
+            'synced_at': now,
+            'rows_new': stats.new,
+            'rows_changed': stats.changed,
+            'rows_unchanged': stats.unchanged
+        }
+        if full:
+            row['full_synced_at'] = now
+        await self._upsert(SyncWatermark.__table__, [row], ['entity'])
+        await self.session.commit()
+
+    async def refresh_task_stats(self):
+        # Пересчёт в одной транзакции: API до фиксации читает предыдущие значения
+        await self.session.execute(text(TASK_STATS_LOCK))
+        for statement in REFRESH_TASK_STATS:
+            await self.session.execute(text(statement))
+        await self.session.commit()
+
+    async def bump_sync_generation(self):
+        result = await self.session.execute(text(
+            "INSERT INTO sync_generation (id, generation, updated_at) VALUES (1, 1, now()) "
+            "ON CONFLICT (id) DO UPDATE SET generation = sync_generation.generation + 1, updated_at = now() "
+            "RETURNING generation"
+        ))
+        generation = result.scalar()
+        # Уведомление доставляется слушателям при фиксации транзакции
+        await self.session.execute(
+            text("SELECT pg_notify(:channel, :payload)"), {'channel': SYNC_CHANNEL, 'payload': str(generation)}
+        )
         await self.session.commit()
+        return generation
 
     async def get_or_create_service_identity(self, user_id):
         service_identity = await self.session.get(ServiceIdentity, user_id)
@@ -0,0 +1,139 @@
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+SYNC_INCREMENTAL = os.getenv('SYNC_INCREMENTAL', 'true').lower() in ('1', 'true', 'yes')
+# Раз в сутки все записи переписываются целиком, чтобы исправить возможный дрейф хешей
+SYNC_FULL_INTERVAL_HOURS = float(os.getenv('SYNC_FULL_INTERVAL_HOURS', 24))
+
+
+# Сущности, изменения которых публикуются в журнал change_events
+CHANGE_ENTITIES = ('employees', 'projects', 'tasks')
+# Смена родителя хранится отдельно от строки задачи, но для клиентов это изменение задачи
+CHANGE_ALIASES = {'subtask_links': 'tasks'}
+
+
+def row_hash(row):
+    return hashlib.blake2b(repr(sorted(row.items())).encode(), digest_size=16).digest()
+
+
+class EntityStats:
+    __slots__ = ('new', 'changed', 'unchanged')
+
+    def __init__(self):
+        self.new = 0
+        self.changed = 0
+        self.unchanged = 0
+
+    def __str__(self):
+        return f"new={self.new} changed={self.changed} unchanged={self.unchanged}"
+
+
+class SyncDelta:
+    def __init__(self, db, full=False, scope=''):
+        self.db = db
+        self.full = full
+        # Имя пространства YouGile: его хеши и отметки хранятся под 'scope/entity'
+        self.scope = scope
+        self.stats = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._pending = {}
+        self._events = {}
+        self.deleted = 0
+
+    @classmethod
+    async def start(cls, db, scope=''):
+        if not SYNC_INCREMENTAL:
+            return cls(db, full=True, scope=scope)
+        watermarks = {
+            entity: watermark for entity, watermark in (await db.get_watermarks()).items()
+            if (entity.startswith(f'{scope}/') if scope else '/' not in entity)
+        }
+        threshold = datetime.now(timezone.utc) - timedelta(hours=SYNC_FULL_INTERVAL_HOURS)
+        full = not watermarks or any(
+            watermark.full_synced_at is None or watermark.full_synced_at < threshold
+            for watermark in watermarks.values()
+        )
+        return cls(db, full=full, scope=scope)
+
+    def state_entity(self, entity):
+        # В журнал событий пишется сама сущность, состояние синхронизации - с префиксом пространства
+        return f'{self.scope}/{entity}' if self.scope else entity
+
+    def fork(self, db):
+        # Для параллельных писателей: своя сессия и свои несохранённые хеши, общая статистика
+        child = SyncDelta(db, full=self.full, scope=self.scope)
+        child.stats = self.stats
+        child.started_at = self.started_at
+        return child
+
+    async def filter(self, entity, rows, key):
+        # Возвращает только новые и изменившиеся строки, хеши запоминаются до commit()
+        hashes = {row[key]: row_hash(row) for row in rows}
+        known = await self.db.get_row_hashes(self.state_entity(entity), list(hashes))
+        stats = self.stats.setdefault(entity, EntityStats())
+        pending = self._pending.setdefault(entity, {})
+        changed = []
+        for row in rows:
+            row_key = row[key]
+            if row_key in pending:
+                continue
+            old_hash = known.get(row_key)
+            if old_hash is None:
+                stats.new += 1
+                self._add_event(entity, 'created', row_key)
+            elif old_hash != hashes[row_key]:
+                stats.changed += 1
+                self._add_event(entity, 'updated', row_key)
+            else:
+                stats.unchanged += 1
+                if not self.full:
+                    continue
+            pending[row_key] = hashes[row_key]
+            changed.append(row)
+        return changed
+
+    def _add_event(self, entity, action, key):
+        if entity in CHANGE_ALIASES:
+            entity, action = CHANGE_ALIASES[entity], 'updated'
+        # Новая задача со ссылкой на родителя - одно событие created, а не два
+        if entity in CHANGE_ENTITIES:
+            self._events.setdefault((entity, key), action)
+
+    async def commit(self):
+        # Хеши и события сохраняются только после успешной записи самих строк
+        for entity, hashes in self._pending.items():
+            if hashes:
+                await self.db.upsert_row_hashes(self.state_entity(entity), hashes, seen_at=self.started_at)
+        await self.db.record_changes([(entity, action, key) for (entity, key), action in self._events.items()])
+        self._pending = {}
+        self._events = {}
+
+    async def finish(self, entities=CHANGE_ENTITIES):
+        # entities - сущности, которые этот запуск действительно загрузил; этапы, выполненные
+        # другой репликой, она же и завершает
+        await self.commit()
+        if self.full:
+            # Только полная синхронизация видит все записи, поэтому только она находит удалённые
+            self.deleted = await self.db.record_deletions(
+                {self.state_entity(entity): entity for entity in CHANGE_ENTITIES if entity in entities},
+                self.started_at
+            )
+        await self.db.trim_change_log()
+        await self.db.purge_deleted_tasks()
+        for entity, stats in self.stats.items():
+            await self.db.set_watermark(self.state_entity(entity), stats, full=self.full)
+
+    def has_changes(self):
+        return self.deleted > 0 or any(stats.new or stats.changed for stats in self.stats.values())
+
+    def report(self):
+        mode = 'full' if self.full else 'incremental'
+        lines = [f"Sync finished ({mode})"] + [f"  {entity}: {stats}" for entity, stats in self.stats.items()]
+        if self.full:
+            lines.append(f"  deleted: {self.deleted}")
+        return '\n'.join(lines)
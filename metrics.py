@@ -0,0 +1,44 @@
+import os
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))
+
+SYNC_DURATION = Histogram(
+    'kanban_sync_duration_seconds', 'Duration of a full sync run', ['workspace'],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+)
+SYNC_STAGE_DURATION = Histogram(
+    'kanban_sync_stage_duration_seconds', 'Time spent per sync stage and phase', ['workspace', 'stage', 'phase'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+SYNC_ROWS = Counter(
+    'kanban_sync_rows_total', 'Rows seen by the sync, by outcome', ['workspace', 'entity', 'result']
+)
+SYNC_FAILURES = Counter('kanban_sync_failures_total', 'Sync runs that raised an error', ['workspace'])
+SYNC_LAST_SUCCESS = Gauge(
+    'kanban_sync_last_success_timestamp_seconds', 'Unix time of the last successful sync', ['workspace']
+)
+SYNC_SLOT_WAIT = Histogram(
+    'kanban_sync_slot_wait_seconds', 'Time a workspace sync waited for a free sync slot', ['workspace'],
+    buckets=(0.1, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+YOUGILE_REQUEST_DURATION = Histogram(
+    'kanban_yougile_request_duration_seconds', 'YouGile API request latency', ['endpoint', 'status']
+)
+YOUGILE_ERRORS = Counter(
+    'kanban_yougile_errors_total', 'Failed YouGile API requests, including retried ones', ['endpoint', 'kind']
+)
+WEBHOOK_EVENTS = Counter(
+    'kanban_webhook_events_total', 'YouGile webhook events taken from the queue', ['entity', 'action']
+)
+WEBHOOK_FAILURES = Counter('kanban_webhook_failures_total', 'Webhook batches that raised an error')
+WEBHOOK_QUEUE_DELAY = Histogram(
+    'kanban_webhook_queue_delay_seconds', 'Time from receiving a webhook to applying it',
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+)
+
+
+def start_metrics_server(port=METRICS_PORT):
+    start_http_server(port)
+    print(f"Metrics are served on port {port}")
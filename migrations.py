@@ -0,0 +1,143 @@
+import asyncio
+
+from sqlalchemy import text
+
+from databases import REFRESH_TASK_STATS, Base, create_engine
+
+# Миграции применяются по порядку и только один раз. Новые добавляются в конец списка.
+# Индексы создаются CONCURRENTLY, чтобы не блокировать запись в живую базу, поэтому
+# каждая команда выполняется в отдельной транзакции (AUTOCOMMIT).
+MIGRATIONS = [
+    ('0001_task_filter_indexes', [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_status_id ON tasks (status, id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_assigned_employee_id_id ON tasks (assigned_employee_id, id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_parent_task_id_id ON tasks (parent_task_id, id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_deadline ON tasks (deadline)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_start_date ON tasks (start_date)",
+    ]),
+    ('0002_lookup_indexes', [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_service_identities_employee_email "
+        "ON service_identities (employee_email)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_project_members_service_user_id "
+        "ON project_members (service_user_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_active_deadline "
+        "ON tasks (deadline) WHERE status = 'Active'",
+    ]),
+    ('0003_project_members_pkey', [
+        "DELETE FROM project_members WHERE project_id IS NULL OR service_user_id IS NULL",
+        "DELETE FROM project_members a USING project_members b "
+        "WHERE a.ctid < b.ctid AND a.project_id = b.project_id AND a.service_user_id = b.service_user_id",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS project_members_pkey "
+        "ON project_members (project_id, service_user_id)",
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'project_members_pkey') THEN
+                ALTER TABLE project_members ADD CONSTRAINT project_members_pkey
+                    PRIMARY KEY USING INDEX project_members_pkey;
+            END IF;
+        END $$
+        """,
+    ]),
+    ('0004_task_roots_index', [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_root_id ON tasks (id) WHERE parent_task_id IS NULL",
+    ]),
+    # Таблицы агрегатов создаёт create_all, здесь они заполняются по уже загруженным задачам
+    ('0005_task_stats', REFRESH_TASK_STATS),
+    ('0006_row_hash_seen_at', [
+        "ALTER TABLE sync_row_hashes ADD COLUMN IF NOT EXISTS seen_at TIMESTAMPTZ",
+    ]),
+    ('0007_name_search_indexes', [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_name_search "
+        "ON tasks USING gin (to_tsvector('simple', coalesce(name, '')))",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_projects_name_search "
+        "ON projects USING gin (to_tsvector('simple', coalesce(name, '')))",
+    ]),
+    # Таблица пересоздаётся секционированной в одной транзакции и на это время блокируется.
+    # Индексы строятся после копирования строк; CONCURRENTLY для секционированных таблиц недоступен.
+    ('0008_tasks_partitioning', [
+        """
+        DO $$
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = 'tasks'::regclass) = 'r' THEN
+                ALTER TABLE tasks RENAME TO tasks_unpartitioned;
+                ALTER INDEX tasks_pkey RENAME TO tasks_unpartitioned_pkey;
+                CREATE TABLE tasks (
+                    id VARCHAR NOT NULL,
+                    assigned_employee_id VARCHAR REFERENCES service_identities (service_user_id),
+                    parent_task_id VARCHAR,
+                    name VARCHAR,
+                    status VARCHAR NOT NULL,
+                    start_date DATE,
+                    end_date DATE,
+                    deadline DATE,
+                    PRIMARY KEY (id, status)
+                ) PARTITION BY LIST (status);
+                CREATE TABLE tasks_active PARTITION OF tasks FOR VALUES IN ('Active');
+                CREATE TABLE tasks_archive PARTITION OF tasks DEFAULT;
+                -- Заготовки подзадач без статуса считаются активными, как и новые заготовки
+                INSERT INTO tasks (id, assigned_employee_id, parent_task_id, name, status, start_date, end_date, deadline)
+                SELECT id, assigned_employee_id, parent_task_id, name, coalesce(status, 'Active'),
+                       start_date, end_date, deadline
+                FROM tasks_unpartitioned;
+                DROP TABLE tasks_unpartitioned;
+                CREATE INDEX ix_tasks_status_id ON tasks (status, id);
+                CREATE INDEX ix_tasks_assigned_employee_id_id ON tasks (assigned_employee_id, id);
+                CREATE INDEX ix_tasks_parent_task_id_id ON tasks (parent_task_id, id);
+                CREATE INDEX ix_tasks_deadline ON tasks (deadline);
+                CREATE INDEX ix_tasks_start_date ON tasks (start_date);
+                CREATE INDEX ix_tasks_active_deadline ON tasks (deadline) WHERE status = 'Active';
+                CREATE INDEX ix_tasks_root_id ON tasks (id) WHERE parent_task_id IS NULL;
+                CREATE INDEX ix_tasks_name_search ON tasks USING gin (to_tsvector('simple', coalesce(name, '')));
+            END IF;
+        END $$
+        """,
+        # autovacuum собирает статистику только по секциям, не по родительской таблице
+        "ANALYZE tasks",
+    ]),
+    ('0009_webhook_workspace', [
+        "ALTER TABLE webhook_events ADD COLUMN IF NOT EXISTS workspace VARCHAR",
+    ]),
+    # Счётчики проектов переименованы в project_members, старые строки scope = 'project' пересчитываются
+    ('0010_project_member_stats', REFRESH_TASK_STATS),
+]
+
+async def migrate(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+        is_new = (await conn.execute(text("SELECT to_regclass('tasks') IS NULL"))).scalar()
+        # Отсутствующие таблицы создаются, существующие не трогаются
+        await conn.run_sync(Base.metadata.create_all)
+        applied = set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars())
+
+    pending = [(version, statements) for version, statements in MIGRATIONS if version not in applied]
+    autocommit = await engine.connect()
+    try:
+        autocommit = await autocommit.execution_options(isolation_level='AUTOCOMMIT')
+        for version, statements in pending:
+            # В новой базе create_all уже создал всё, что описано в моделях
+            if not is_new:
+                print(f"Applying migration {version}")
+                for statement in statements:
+                    await autocommit.execute(text(statement))
+            await autocommit.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:version)"), {'version': version}
+            )
+    finally:
+        await autocommit.close()
+    print(f"Database is up to date, {len(pending)} migration(s) applied")
+
+
+async def main():
+    engine = create_engine()
+    try:
+        await migrate(engine)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,120 +1,510 @@
 import asyncio
-from datetime import datetime, timezone
+import os
+import socket
+import time
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from typing import NamedTuple, Optional
 
-from yougile import YouGile
-from databases import AsyncDatabase, Task, Project, Employee, ServiceIdentity
+from databases import WEBHOOK_CHANNEL, AsyncDatabase, create_engine
+from delta import SyncDelta
+from metrics import (
+    SYNC_DURATION, SYNC_FAILURES, SYNC_LAST_SUCCESS, SYNC_ROWS, SYNC_SLOT_WAIT, SYNC_STAGE_DURATION,
+    WEBHOOK_EVENTS, WEBHOOK_FAILURES, WEBHOOK_QUEUE_DELAY, start_metrics_server
+)
+from workspaces import DEFAULT_WORKSPACE, load_workspaces
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+# Сколько загруженных страниц может ждать записи на каждом этапе
+SYNC_QUEUE_SIZE = int(os.getenv('SYNC_QUEUE_SIZE', 4))
+SYNC_INTERVAL_MINUTES = float(os.getenv('SYNC_INTERVAL_MINUTES', 5))
+# Сколько пространств синхронизируется одновременно; остальные ждут свободного места в порядке очереди
+SYNC_MAX_PARALLEL_WORKSPACES = int(os.getenv('SYNC_MAX_PARALLEL_WORKSPACES', 4))
+# Зависшая синхронизация одного пространства прерывается и освобождает место; 0 - без ограничения
+SYNC_WORKSPACE_TIMEOUT_MINUTES = float(os.getenv('SYNC_WORKSPACE_TIMEOUT_MINUTES', 60))
+# Имя реплики парсера в sync_runs
+SYNC_REPLICA = os.getenv('SYNC_REPLICA') or f'{socket.gethostname()}:{os.getpid()}'
 
-async def employees_processing(employees):
+# С вебхуками изменения приходят сразу, а полная синхронизация только сверяет данные
+WEBHOOKS_ENABLED = os.getenv('WEBHOOKS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SYNC_RECONCILE_INTERVAL_MINUTES = float(os.getenv('SYNC_RECONCILE_INTERVAL_MINUTES', 60))
+# Сколько ждать после первого события, чтобы применить всю пачку одним проходом
+WEBHOOK_COALESCE_SECONDS = float(os.getenv('WEBHOOK_COALESCE_SECONDS', 1))
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 1000))
+# Очередь проверяется и без уведомлений, на случай потерянного соединения
+WEBHOOK_POLL_INTERVAL = 30
+WEBHOOK_LOCK = 'sync:webhooks'
+
+UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+
+# Компактные записи, в которые элементы ответа YouGile сворачиваются сразу при разборе страницы:
+# от полного словаря остаются только поля, которые пишутся в базу
+class EmployeeRecord(NamedTuple):
+    id: str
+    email: str
+    real_name: Optional[str]
+
+
+class ProjectRecord(NamedTuple):
+    id: str
+    title: str
+    users: tuple
+
+
+class TaskRecord(NamedTuple):
+    id: str
+    assigned_employee_id: Optional[str]
+    name: str
+    status: str
+    start_date: date
+    end_date: Optional[date]
+    deadline: Optional[date]
+    subtasks: tuple
+
+
+def timestamp_date(timestamp):
+    # В базе хранятся даты, поэтому день UTC считается прямо из миллисекунд, без datetime
+    return date.fromordinal(UNIX_EPOCH_ORDINAL + int(timestamp) // MS_PER_DAY)
+
+
+def employee_record(employee, workspace=DEFAULT_WORKSPACE):
+    return EmployeeRecord(workspace.user_key(employee['id']), employee['email'], employee['realName'])
+
+
+def project_record(project_data, workspace=DEFAULT_WORKSPACE):
+    # ID пользователей
+    users = sorted(workspace.user_key(user_id) for user_id in project_data.get('users', {}))
+    return ProjectRecord(project_data['id'], project_data['title'], tuple(users))
+
+
+def task_record(task_data, workspace=DEFAULT_WORKSPACE):
+    # Определение статуса задачи
+    if task_data['archived']:
+        status = 'Archived'
+    elif task_data['completed']:
+        status = 'Completed'
+    else:
+        status = 'Active'
+
+    # Конвертация временных меток и обработка отсутствующих значений
+    end_date = timestamp_date(task_data['completedTimestamp']) if 'completedTimestamp' in task_data else None
+    deadline = timestamp_date(task_data['deadline'].get('deadline', 0)) if 'deadline' in task_data else None
+
+    # В API v2 исполнители приходят списком, в схеме хранится один
+    assigned = task_data.get('assigned')
+    if isinstance(assigned, list):
+        assigned = assigned[0] if assigned else None
+
+    return TaskRecord(
+        task_data['id'], workspace.user_key(assigned), task_data['title'], status, timestamp_date(task_data['timestamp']),
+        end_date, deadline, tuple(task_data.get('subtasks', ()))
+    )
+
+
+async def employees_processing(db, employees, delta=None, workspace=DEFAULT_WORKSPACE):
     if employees['content']:
+        users = []
+        service_identities = []
         for employee in employees['content']:
-            employee_id = employee['id']
-            real_name = employee['realName']
-            email = employee['email']
-            user = Employee(
-                email=email,
-                first_name=real_name
-            )
-            service_identitie = ServiceIdentity(
-                employee_email=email,
-                service_name='yougile',
-                service_user_id=employee_id
-            )
-            async with AsyncDatabase() as db:
-                await db.add_update_employee(user)
-                await db.add_update_service_identity(service_identitie)
-
+            users.append({'email': employee.email, 'first_name': employee.real_name})
+            service_identities.append({
+                'service_user_id': employee.id,
+                'employee_email': employee.email,
+                'service_name': workspace.service_name
+            })
+        if delta is not None:
+            users = await delta.filter('employees', users, 'email')
+            service_identities = await delta.filter('service_identities', service_identities, 'service_user_id')
+        await db.upsert_employees(users)
+        await db.upsert_service_identities(service_identities)
+        if delta is not None:
+            await delta.commit()
     else:
         print("Список сотрудников пуст.")
 
-async def projects_processing(projects):
+async def projects_processing(db, projects, delta=None, workspace=DEFAULT_WORKSPACE):
     if projects['content']:
-        async with AsyncDatabase() as db:
-            for project_data in projects['content']:
-                project_id = project_data['id']
-                name = project_data['title']
-                users = project_data.get('users', {})  # Словарь ID пользователей
-
-                project_instance = Project(id=project_id, name=name)
+        project_rows = [
+            {'id': project.id, 'name': project.title, 'users': project.users}
+            for project in projects['content']
+        ]
+        if delta is not None:
+            project_rows = await delta.filter('projects', project_rows, 'id')
 
-                # Обработка пользователей
-                for user_id in users.keys():
-                    # Проверка существования пользователя и добавление в проект
-                    service_identity = await db.get_or_create_service_identity(user_id)
-                    project_instance.members.append(service_identity)
-
-                await db.add_update_project(project_instance)
+        await db.upsert_projects([{'id': row['id'], 'name': row['name']} for row in project_rows])
+        # Состав участников сравнивается с project_members в базе, пишутся только изменения
+        await db.sync_project_members(
+            {row['id']: row['users'] for row in project_rows}, workspace.service_name
+        )
+        if delta is not None:
+            await delta.commit()
     else:
         print("Список проектов пуст.")
 
 
-async def tasks_processing(tasks):
+def task_row(task):
+    return {
+        'id': task.id,
+        'assigned_employee_id': task.assigned_employee_id,
+        'name': task.name,
+        'status': task.status,
+        'start_date': task.start_date,
+        'end_date': task.end_date,
+        'deadline': task.deadline
+    }
+
+
+async def tasks_processing(db, tasks, delta=None, workspace=DEFAULT_WORKSPACE):
     if tasks['content']:
-        async with AsyncDatabase() as db:
-            for task_data in tasks['content']:
-                task_id = task_data['id']
-                if 'assigned' in task_data:
-                    assigned_employee_id = task_data['assigned']
-                else:
-                    assigned_employee_id = None
-                subtask_ids = task_data.get('subtasks', [])
-                name = task_data['title']
-
-                # Определение статуса задачи
-                if task_data['archived']:
-                    status = 'Archived'
-                elif task_data['completed']:
-                    status = 'Completed'
-                else:
-                    status = 'Active'
-
-                # Конвертация временных меток и обработка отсутствующих значений
-                start_date = datetime.utcfromtimestamp(task_data['timestamp'] / 1000.0).replace(tzinfo=timezone.utc)
-                end_date = datetime.utcfromtimestamp(task_data.get('completedTimestamp', 0) / 1000.0).replace(
-                    tzinfo=timezone.utc) if 'completedTimestamp' in task_data else None
-                deadline = datetime.utcfromtimestamp(task_data.get('deadline', {}).get('deadline', 0) / 1000.0).replace(
-                    tzinfo=timezone.utc) if 'deadline' in task_data else None
-
-                # Создание или обновление основной задачи
-                main_task = Task(
-                    id=task_id,
-                    assigned_employee_id=assigned_employee_id,
-                    name=name,
-                    status=status,
-                    start_date=start_date,
-                    end_date=end_date,
-                    deadline=deadline
-                )
-                await db.add_update_task(main_task)
-
-                for subtask_id in subtask_ids:
-                    subtask = Task(
-                        id=subtask_id,
-                        parent_task_id=task_id,
-                    )
-                    await db.add_update_task(subtask)
+        task_rows = []
+        subtask_links = []
+        for task in tasks['content']:
+            task_rows.append(task_row(task))
+            for subtask_id in task.subtasks:
+                subtask_links.append({'id': subtask_id, 'parent_task_id': task.id})
+        if delta is not None:
+            task_rows = await delta.filter('tasks', task_rows, 'id')
+            subtask_links = await delta.filter('subtask_links', subtask_links, 'id')
+
+        # Исполнители могут отсутствовать в списке сотрудников
+        await db.ensure_service_identities(
+            {row['assigned_employee_id'] for row in task_rows}, workspace.service_name
+        )
+        await db.upsert_tasks(task_rows, subtask_links)
+        if delta is not None:
+            await delta.commit()
     else:
         print("Список задач пуст.")
 
-async def process_data():
-    yougile = YouGile()
-    employees = await yougile.get_employees()
-    await employees_processing(employees)
-    projects = await yougile.get_projects()
-    await projects_processing(projects)
-    tasks = await yougile.get_tasks()
-    await tasks_processing(tasks)
+class SyncStage:
+    def __init__(self, name, pages, processing, depends_on=()):
+        self.name = name
+        self.pages = pages
+        self.processing = processing
+        self.depends_on = depends_on
+        # Ограниченная очередь не даёт загрузке уйти далеко вперёд записи
+        self.queue = asyncio.Queue(maxsize=SYNC_QUEUE_SIZE)
+        self.done = asyncio.Event()
+        # Причина, по которой этап не выполнялся: locked или fresh
+        self.skipped = None
+        self.pages_count = 0
+        self.fetch_time = 0.0
+        self.wait_time = 0.0
+        self.write_time = 0.0
+
+    @property
+    def ran(self):
+        return self.done.is_set() and self.skipped is None
+
+    async def run(self, engine, delta, run_id, workspace, fresh_seconds=0, awaited=False):
+        # Этап одного пространства в каждый момент выполняет только одна реплика парсера.
+        # Блокировка держится на соединении, через которое этап и пишет, и отпускается вместе с ним.
+        started = time.perf_counter()
+        lock_key = f'sync:{delta.state_entity(self.name)}'
+        async with engine.connect() as conn, AsyncDatabase(conn) as db:
+            if not await db.try_advisory_lock(lock_key):
+                self.skipped = 'locked'
+                # Зависящие этапы пишут только после того, как другая реплика закончит этот
+                if awaited:
+                    await db.wait_advisory_lock(lock_key)
+            else:
+                try:
+                    since = datetime.now(timezone.utc) - timedelta(seconds=fresh_seconds)
+                    if fresh_seconds and await db.stage_synced_since(workspace.name, self.name, since):
+                        # Реплика, запущенная позже другой, не повторяет уже сделанную работу
+                        self.skipped = 'fresh'
+                    else:
+                        async with asyncio.TaskGroup() as group:
+                            group.create_task(self.fetch())
+                            group.create_task(self.write(db, delta))
+                        await db.record_sync_stage(run_id, self.name, time.perf_counter() - started)
+                finally:
+                    try:
+                        await db.advisory_unlock(lock_key)
+                    except Exception:
+                        # Соединение с неотпущенной блокировкой не должно вернуться в пул
+                        await conn.invalidate()
+                        raise
+            if self.skipped:
+                await db.record_sync_stage(run_id, self.name, skipped=self.skipped)
+        self.done.set()
+
+    async def fetch(self):
+        started = time.perf_counter()
+        async for page in self.pages:
+            self.pages_count += 1
+            await self.queue.put(page)
+        await self.queue.put(None)
+        self.fetch_time = time.perf_counter() - started
+
+    async def write(self, db, delta):
+        # Запись ждёт только те этапы, на строки которых ссылаются внешние ключи
+        started = time.perf_counter()
+        for stage in self.depends_on:
+            await stage.done.wait()
+        self.wait_time = time.perf_counter() - started
+        stage_delta = delta.fork(db)
+        while (page := await self.queue.get()) is not None:
+            page_started = time.perf_counter()
+            await self.processing(db, page, stage_delta)
+            self.write_time += time.perf_counter() - page_started
+
+    def observe(self, workspace):
+        if not self.ran:
+            return
+        SYNC_STAGE_DURATION.labels(workspace, self.name, 'fetch').observe(self.fetch_time)
+        SYNC_STAGE_DURATION.labels(workspace, self.name, 'wait').observe(self.wait_time)
+        SYNC_STAGE_DURATION.labels(workspace, self.name, 'write').observe(self.write_time)
+
+    def report(self):
+        if self.skipped:
+            return f"  {self.name}: skipped ({self.skipped})"
+        return (f"  {self.name}: {self.pages_count} page(s), fetch {self.fetch_time:.2f}s, "
+                f"waited {self.wait_time:.2f}s, write {self.write_time:.2f}s")
+
+
+async def process_data(workspace=DEFAULT_WORKSPACE, engine=None, fresh_seconds=0):
+    # fresh_seconds: этап пропускается, если его выполнил запуск, начавшийся не раньше этого срока
+    started = time.perf_counter()
+    async with workspace.client() as yougile, AsyncDatabase(engine) as db:
+        run_id = await db.start_sync_run(workspace.name, SYNC_REPLICA)
+        status, error = 'failed', None
+        try:
+            delta = await SyncDelta.start(db, scope=workspace.scope)
+            # Загрузка всех сущностей идёт одновременно, каждая страница записывается сразу.
+            # Проекты и задачи ссылаются на service_identities, поэтому пишутся после сотрудников.
+            employees = SyncStage(
+                'employees', yougile.iter_employees(partial(employee_record, workspace=workspace)),
+                partial(employees_processing, workspace=workspace)
+            )
+            projects = SyncStage(
+                'projects', yougile.iter_projects(partial(project_record, workspace=workspace)),
+                partial(projects_processing, workspace=workspace), depends_on=[employees]
+            )
+            tasks = SyncStage(
+                'tasks', yougile.iter_tasks(partial(task_record, workspace=workspace)),
+                partial(tasks_processing, workspace=workspace), depends_on=[employees]
+            )
+            stages = [employees, projects, tasks]
+            async with asyncio.TaskGroup() as group:
+                for stage in stages:
+                    awaited = any(stage in other.depends_on for other in stages)
+                    group.create_task(stage.run(db.engine, delta, run_id, workspace, fresh_seconds, awaited))
+
+            await delta.finish([stage.name for stage in stages if stage.ran])
+            if delta.has_changes():
+                await db.refresh_task_stats()
+                # Сбрасывает кеш ответов API
+                await db.bump_sync_generation()
+            status = 'success' if any(stage.ran for stage in stages) else 'skipped'
+        except asyncio.CancelledError:
+            status = 'cancelled'
+            raise
+        except Exception as e:
+            SYNC_FAILURES.labels(workspace.name).inc()
+            error = repr(e)
+            raise
+        finally:
+            await db.session.rollback()
+            await db.finish_sync_run(run_id, status, error)
+
+    duration = time.perf_counter() - started
+    SYNC_DURATION.labels(workspace.name).observe(duration)
+    SYNC_LAST_SUCCESS.labels(workspace.name).set_to_current_time()
+    for stage in stages:
+        stage.observe(workspace.name)
+    for entity, stats in delta.stats.items():
+        SYNC_ROWS.labels(workspace.name, entity, 'new').inc(stats.new)
+        SYNC_ROWS.labels(workspace.name, entity, 'changed').inc(stats.changed)
+        SYNC_ROWS.labels(workspace.name, entity, 'unchanged').inc(stats.unchanged)
+    print(f"Workspace {workspace.name}:")
+    print(delta.report())
+    print('\n'.join(['Stage timings:'] + [stage.report() for stage in stages]))
+    print(f"  total: {duration:.2f}s")
+
+
+class SingleFlight:
+    # Вызов с ключом, для которого работа уже идёт (или ждёт места), присоединяется к ней,
+    # а не запускает вторую: запуски по расписанию и вручную сливаются в один
+    def __init__(self):
+        self._running = {}
+
+    async def run(self, key, factory):
+        task = self._running.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._running[key] = task
+            task.add_done_callback(lambda _: self._running.pop(key, None))
+        # Отмена одного из ожидающих не прерывает общую работу
+        return await asyncio.shield(task)
+
+
+SYNC_FLIGHTS = SingleFlight()
+
+
+async def sync_workspace(workspace, engine, slots, fresh_seconds=0):
+    await SYNC_FLIGHTS.run(workspace.name, partial(_sync_workspace, workspace, engine, slots, fresh_seconds))
+
+
+async def _sync_workspace(workspace, engine, slots, fresh_seconds):
+    # Одновременно идут не больше SYNC_MAX_PARALLEL_WORKSPACES синхронизаций, место достаётся
+    # в порядке очереди. Ошибка или зависание одного пространства не задевает остальные.
+    waited = time.perf_counter()
+    async with slots:
+        SYNC_SLOT_WAIT.labels(workspace.name).observe(time.perf_counter() - waited)
+        try:
+            async with asyncio.timeout(SYNC_WORKSPACE_TIMEOUT_MINUTES * 60 or None):
+                await process_data(workspace, engine, fresh_seconds)
+        except TimeoutError:
+            SYNC_FAILURES.labels(workspace.name).inc()
+            print(f"Workspace {workspace.name}: sync timed out after {SYNC_WORKSPACE_TIMEOUT_MINUTES:g} mins")
+        except Exception as e:
+            print(f"Workspace {workspace.name}: sync failed: {e!r}")
+
+
+# Порядок важен: проекты и задачи ссылаются на service_identities сотрудников
+WEBHOOK_PROCESSING = {
+    'employees': (employee_record, employees_processing),
+    'projects': (project_record, projects_processing),
+    'tasks': (task_record, tasks_processing),
+}
+
+
+class WebhookWorker:
+    def __init__(self, engine, workspaces=(DEFAULT_WORKSPACE,)):
+        self.engine = engine
+        # События без имени пространства относятся к пространству без префикса
+        self.workspaces = {workspace.name if workspace.scoped else None: workspace for workspace in workspaces}
+        self._wakeup = asyncio.Event()
+
+    async def run(self):
+        listener = asyncio.create_task(self._listen())
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), WEBHOOK_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                # Пачка событий одного изменения (перемещение, правка полей) применяется вместе
+                await asyncio.sleep(WEBHOOK_COALESCE_SECONDS)
+                try:
+                    while await self.apply_batch() == WEBHOOK_BATCH_SIZE:
+                        pass
+                except Exception as e:
+                    WEBHOOK_FAILURES.inc()
+                    print(f"Webhook batch failed, events stay queued: {e}")
+        finally:
+            listener.cancel()
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    connection = (await conn.get_raw_connection()).driver_connection
+                    closed = asyncio.Event()
+                    connection.add_termination_listener(lambda _: closed.set())
+                    wakeup = lambda *_: self._wakeup.set()
+                    await connection.add_listener(WEBHOOK_CHANNEL, wakeup)
+                    # События, пришедшие без подключения, тоже нужно забрать
+                    self._wakeup.set()
+                    try:
+                        await closed.wait()
+                    finally:
+                        if not connection.is_closed():
+                            await connection.remove_listener(WEBHOOK_CHANNEL, wakeup)
+            except Exception as e:
+                print(f"Webhook listener disconnected: {e}")
+            await asyncio.sleep(5)
+
+    async def apply_batch(self):
+        # Очередь разбирает одна реплика за раз, иначе события применялись бы дважды
+        async with self.engine.connect() as conn, AsyncDatabase(conn) as db:
+            if not await db.try_advisory_lock(WEBHOOK_LOCK):
+                return 0
+            try:
+                events = await db.get_webhook_events(WEBHOOK_BATCH_SIZE)
+                if not events:
+                    return 0
+                # Из нескольких событий по одной записи важно только последнее
+                latest = {}
+                for event in events:
+                    latest[(event.workspace, event.entity, event.key)] = event
+                has_changes = False
+                for workspace_name, workspace in self.workspaces.items():
+                    delta = SyncDelta(db, scope=workspace.scope)
+                    deleted_count = 0
+                    for entity, (record, processing) in WEBHOOK_PROCESSING.items():
+                        entity_events = [
+                            event for (name, event_entity, _), event in latest.items()
+                            if name == workspace_name and event_entity == entity
+                        ]
+                        upserts = [
+                            record(event.payload, workspace=workspace) for event in entity_events
+                            if event.action != 'deleted'
+                        ]
+                        deleted = [event.key for event in entity_events if event.action == 'deleted']
+                        if entity == 'employees':
+                            # Вебхук сообщает ID пользователя, а сотрудники, их хеши и события
+                            # хранятся по почте: она берётся из service_identities
+                            user_ids = [workspace.user_key(key) for key in deleted]
+                            emails = await db.get_identity_emails(user_ids)
+                            await db.forget_row_hashes(delta.state_entity('service_identities'), user_ids)
+                            deleted = sorted(set(emails.values()))
+                        if upserts:
+                            await processing(db, {'content': upserts}, delta, workspace=workspace)
+                        deleted_count += await db.record_deleted(entity, deleted, delta.state_entity(entity))
+                    has_changes = has_changes or delta.has_changes() or deleted_count > 0
+                unknown = {event.workspace for event in events} - set(self.workspaces)
+                if unknown:
+                    # Подписка осталась у пространства, которого больше нет в файле: события отбрасываются
+                    print(f"Dropped webhook events of unknown workspace(s): {', '.join(sorted(unknown))}")
+                if has_changes:
+                    await db.refresh_task_stats()
+                    await db.bump_sync_generation()
+                await db.delete_webhook_events([event.id for event in events])
+
+            finally:
+                await db.advisory_unlock(WEBHOOK_LOCK)
+
+        now = datetime.now(timezone.utc)
+        for event in events:
+            WEBHOOK_EVENTS.labels(event.entity, event.action).inc()
+            WEBHOOK_QUEUE_DELAY.observe((now - event.received_at).total_seconds())
+        print(f"Applied {len(events)} webhook event(s) as {len(latest)} change(s)")
+        return len(events)
 
 
 def run_scheduler():
-    print('Starting every 5 mins')
+    default_interval = SYNC_RECONCILE_INTERVAL_MINUTES if WEBHOOKS_ENABLED else SYNC_INTERVAL_MINUTES
+    workspaces = load_workspaces()
+    start_metrics_server()
+    # Все пространства пишут через один пул соединений
+    engine = create_engine()
+    slots = asyncio.Semaphore(SYNC_MAX_PARALLEL_WORKSPACES)
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(process_data, 'interval', minutes=5)
+    now = datetime.now(timezone.utc)
+    for n, workspace in enumerate(workspaces):
+        interval = workspace.interval_minutes or default_interval
+        print(f"Syncing workspace {workspace.name} every {interval:g} mins")
+        # У каждого пространства своя задача: медленное пропускает только свои запуски, а первые
+        # запуски разнесены по интервалу, чтобы пространства не стартовали одновременно.
+        # Этапы, которые другая реплика выполнила за последние полинтервала, пропускаются.
+        scheduler.add_job(
+            sync_workspace, 'interval', args=[workspace, engine, slots, interval * 60 / 2],
+            minutes=interval, id=workspace.name,
+            max_instances=1, coalesce=True, misfire_grace_time=None,
+            next_run_time=now + timedelta(minutes=interval * (n + 1) / len(workspaces)),
+        )
     scheduler.start()
 
     # Запуск цикла событий asyncio
     loop = asyncio.get_event_loop()
+    if WEBHOOKS_ENABLED:
+        print("Applying YouGile webhooks")
+        loop.create_task(WebhookWorker(engine, workspaces).run())
     try:
         loop.run_forever()
     except (KeyboardInterrupt, SystemExit):
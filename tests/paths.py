@@ -0,0 +1,18 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT_DIR, 'app')
+
+# Модули с одинаковыми именами в корне (синхронизация) и в app/ (API)
+SHARED_NAMES = ('databases', 'metrics')
+
+
+def use_modules(directory):
+    # Тестовый модуль импортирует модули одного дерева; уже импортированные модули
+    # другого дерева убираются из sys.modules, ссылки на них в других тестах остаются
+    for name in SHARED_NAMES:
+        module = sys.modules.get(name)
+        if module is not None and os.path.dirname(os.path.abspath(module.__file__)) != directory:
+            del sys.modules[name]
+    sys.path[:] = [directory] + [path for path in sys.path if path not in (ROOT_DIR, APP_DIR)]
@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+import pytest
+
+from paths import ROOT_DIR, use_modules
+
+use_modules(ROOT_DIR)
+
+from sqlalchemy import text
+
+from databases import AsyncDatabase, create_engine
+from migrations import migrate
+
+pytestmark = pytest.mark.skipif(not os.getenv('DATABASE_NAME'), reason='DATABASE_NAME is not set')
+
+FIRST = 'change-log-test-first'
+SECOND = 'change-log-test-second'
+
+
+async def cleanup(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM change_events WHERE key IN (:first, :second)"),
+                           {'first': FIRST, 'second': SECOND})
+
+
+async def visible_events(engine, after):
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT seq, key FROM change_events WHERE seq > :after AND key IN (:first, :second) ORDER BY seq"
+        ), {'after': after, 'first': FIRST, 'second': SECOND})
+        return result.all()
+
+
+async def interleave_writers():
+    # Первая транзакция вставила событие и ещё не зафиксирована, когда вторая пишет своё
+    engine = create_engine()
+    try:
+        await migrate(engine)
+        await cleanup(engine)
+        async with engine.connect() as conn:
+            after = (await conn.execute(text("SELECT coalesce(max(seq), 0) FROM change_events"))).scalar()
+
+        inserted = asyncio.Event()
+        release = asyncio.Event()
+        async with AsyncDatabase(engine) as first, AsyncDatabase(engine) as second:
+            notify = first._notify_changes
+
+            async def paused_notify():
+                # Вызывается после вставки, до фиксации
+                inserted.set()
+                await release.wait()
+                await notify()
+
+            first._notify_changes = paused_notify
+            first_write = asyncio.create_task(first.record_changes([('tasks', 'updated', FIRST)]))
+            await inserted.wait()
+            second_write = asyncio.create_task(second.record_changes([('tasks', 'updated', SECOND)]))
+            await asyncio.sleep(0.5)
+            # Читатель, пришедший в этот момент, не должен увидеть второе событие раньше первого
+            seen_while_pending = await visible_events(engine, after)
+            second_blocked = not second_write.done()
+            release.set()
+            await asyncio.gather(first_write, second_write)
+        return seen_while_pending, second_blocked, await visible_events(engine, after)
+    finally:
+        await cleanup(engine)
+        await engine.dispose()
+
+
+def test_change_events_become_visible_in_seq_order():
+    seen_while_pending, second_blocked, events = asyncio.run(interleave_writers())
+    assert seen_while_pending == []
+    assert second_blocked
+    assert [key for seq, key in events] == [FIRST, SECOND]
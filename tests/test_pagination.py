@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from paths import APP_DIR, use_modules
+
+use_modules(APP_DIR)
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from main import app
+from pagination import decode_cursor, encode_cursor
+from search import search_cursor
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor('task-1'), str) == ['task-1']
+    assert search_cursor(encode_cursor(0.5, 'task-1')) == [0.5, 'task-1']
+    assert decode_cursor(None, str) is None
+
+
+@pytest.mark.parametrize('cursor', [
+    encode_cursor(1),
+    encode_cursor(None),
+    encode_cursor(True),
+    encode_cursor('task-1', 'task-2'),
+    encode_cursor(),
+    'not a cursor',
+    'e30',  # {}
+])
+def test_malformed_list_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, str)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize('cursor', [encode_cursor('task-1'), encode_cursor('0.5', 'task-1'), encode_cursor(0.5, 1)])
+def test_malformed_search_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        search_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.skipif(not os.getenv('DATABASE_NAME'), reason='DATABASE_NAME is not set')
+@pytest.mark.parametrize('path', ['/employees/', '/projects/', '/tasks/', '/tasks/tree'])
+def test_router_rejects_cursor_of_wrong_type(path):
+    with TestClient(app) as client:
+        response = client.get(
+            path, params={'cursor': encode_cursor(1)}, headers={'Authorization': f"Bearer {os.getenv('API_TOKEN')}"}
+        )
+    assert response.status_code == 400
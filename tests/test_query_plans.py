@@ -0,0 +1,196 @@
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import pytest
+
+from paths import APP_DIR, ROOT_DIR, use_modules
+
+use_modules(APP_DIR)
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from databases import AsyncDatabase, create_engine, get_dsn
+
+# Планы проверяются в отдельной базе <DATABASE_NAME>_plans: схему создают миграции, данные - SEED,
+# после теста база удаляется. Seq scan не отключается, таблицы достаточно большие, чтобы индекс был выгоднее
+pytestmark = pytest.mark.skipif(not os.getenv('DATABASE_NAME'), reason='DATABASE_NAME is not set')
+
+TASKS = 100000
+EMPLOYEES = 20000
+PROJECTS = 5000
+MEMBERS = 20
+
+SEED = [
+    "INSERT INTO employees (email, first_name) "
+    f"SELECT 'user' || i || '@example.com', 'User ' || i FROM generate_series(0, {EMPLOYEES - 1}) i",
+    "INSERT INTO service_identities (service_user_id, employee_email, service_name) "
+    f"SELECT 'user-' || i, 'user' || i || '@example.com', 'yougile' FROM generate_series(0, {EMPLOYEES - 1}) i",
+    "INSERT INTO projects (id, name) "
+    f"SELECT 'project-' || i, 'Project ' || i FROM generate_series(0, {PROJECTS - 1}) i",
+    "INSERT INTO project_members (project_id, service_user_id) "
+    f"SELECT 'project-' || p, 'user-' || ((p * {MEMBERS} + m) % {EMPLOYEES}) "
+    f"FROM generate_series(0, {PROJECTS - 1}) p, generate_series(0, {MEMBERS - 1}) m",
+    # Каждая третья задача - подзадача предыдущей; 60% активных, остальные в архивной секции
+    "INSERT INTO tasks (id, name, status, deadline, start_date, assigned_employee_id, parent_task_id) "
+    "SELECT 'task-' || i, 'Task ' || i || ' report', "
+    "CASE WHEN i % 10 < 6 THEN 'Active' WHEN i % 10 < 9 THEN 'Completed' ELSE 'Archived' END, "
+    "CURRENT_DATE + (i % 120 - 60), CURRENT_DATE - (i % 90), "
+    f"'user-' || (i % {EMPLOYEES}), CASE WHEN i % 3 = 0 THEN NULL ELSE 'task-' || (i - i % 3) END "
+    f"FROM generate_series(0, {TASKS - 1}) i",
+    "INSERT INTO task_status_counts (scope, key, status, count) "
+    "SELECT 'employee', 'user' || i || '@example.com', status, 10 "
+    f"FROM generate_series(0, {EMPLOYEES - 1}) i, unnest(ARRAY['Active', 'Completed', 'Archived']) status",
+    "INSERT INTO task_deadline_counts (scope, key, deadline, count) "
+    "SELECT 'employee', 'user' || i || '@example.com', CURRENT_DATE + d, 1 "
+    f"FROM generate_series(0, {EMPLOYEES - 1}) i, generate_series(-60, 60) d",
+]
+
+
+class RecordingDatabase(AsyncDatabase):
+    # Запоминает операторы, которые методы на самом деле отправляют в базу
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.statements = []
+
+    async def _read(self, query):
+        self.statements.append(query)
+        return await super()._read(query)
+
+
+# Метод AsyncDatabase с аргументами, как его вызывает роутер, и индексы, которые должны быть в планах.
+# Индексы секций tasks называются по индексу родительской таблицы
+CASES = {
+    'GET /tasks/': (lambda db: db.get_all_tasks(limit=1001, status=['Active']), {'ix_tasks_status_id'}),
+    'GET /tasks/ next page': (
+        lambda db: db.get_all_tasks(limit=1001, after='task-5000', status=['Active']), {'ix_tasks_status_id'}
+    ),
+    'GET /tasks/?status=Completed': (
+        lambda db: db.get_all_tasks(limit=101, status=['Completed']), {'ix_tasks_status_id'}
+    ),
+    'GET /tasks/?assigned_employee_id': (
+        lambda db: db.get_all_tasks(limit=101, status=['Active'], assigned_employee_id='user-7'),
+        {'ix_tasks_assigned_employee_id_id'}
+    ),
+    'GET /tasks/?parent_task_id': (
+        lambda db: db.get_all_tasks(limit=101, status=['Active'], parent_task_id='task-300'),
+        {'ix_tasks_parent_task_id_id'}
+    ),
+    'GET /tasks/tree': (
+        lambda db: db.get_task_trees(limit=101, after='task-300'),
+        {'ix_tasks_root_id', 'tasks_pkey', 'ix_tasks_parent_task_id_id'}
+    ),
+    'GET /tasks/{id}/tree': (
+        lambda db: db.get_task_trees(root_id='task-300'), {'tasks_pkey', 'ix_tasks_parent_task_id_id'}
+    ),
+    'GET /tasks/search': (
+        lambda db: db.search_tasks('4217:*', limit=21, status=['Active']), {'ix_tasks_name_search'}
+    ),
+    'GET /tasks/search next page': (
+        lambda db: db.search_tasks('4217:*', limit=21, after=[0.05, 'task-4217'], status=['Active']),
+        {'ix_tasks_name_search'}
+    ),
+    'POST /tasks/{id}': (lambda db: db.get_by_id_task('task-300'), {'tasks_pkey'}),
+    'POST /tasks/batch': (lambda db: db.get_tasks_by_ids([f'task-{i}' for i in range(0, 2000, 100)]), {'tasks_pkey'}),
+    'POST /tasks/assigned/{id}': (lambda db: db.get_assigned_tasks('user-7'), {'ix_tasks_assigned_employee_id_id'}),
+    'POST /tasks/email/{email}': (
+        lambda db: db.get_tasks_by_email('user7@example.com'),
+        {'ix_service_identities_employee_email', 'ix_tasks_assigned_employee_id_id'}
+    ),
+    'GET /employees/ next page': (
+        lambda db: db.get_all_employees(limit=1001, after='user1@example.com'), {'employees_pkey'}
+    ),
+    'POST /employees/batch': (
+        lambda db: db.get_employees_by_emails([f'user{i}@example.com' for i in range(20)]), {'employees_pkey'}
+    ),
+    'GET /employees/{email}/profile': (
+        lambda db: db.get_employee_profile('user7@example.com'),
+        {'employees_pkey', 'ix_service_identities_employee_email', 'ix_project_members_service_user_id',
+         'projects_pkey', 'ix_tasks_assigned_employee_id_id'}
+    ),
+    'GET /projects/ next page': (lambda db: db.get_all_projects(limit=101, after='project-1'), {'projects_pkey'}),
+    'GET /projects/search': (lambda db: db.search_projects('4217:*', limit=21), {'ix_projects_name_search'}),
+    'POST /projects/batch': (
+        lambda db: db.get_projects_by_ids([f'project-{i}' for i in range(20)]), {'projects_pkey'}
+    ),
+    'GET /stats/employees/{email}': (
+        lambda db: db.get_task_stats('employee', key='user7@example.com'),
+        {'task_status_counts_pkey', 'task_deadline_counts_pkey'}
+    ),
+}
+
+
+@pytest.fixture(scope='module')
+def plans_database():
+    name = f"{os.getenv('DATABASE_NAME')}_plans"
+    dsn = make_url(get_dsn()).set(database=name).render_as_string(hide_password=False)
+
+    async def admin(statement):
+        engine = create_engine(isolation_level='AUTOCOMMIT')
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text(statement))
+        finally:
+            await engine.dispose()
+
+    async def seed():
+        engine = create_engine(dsn)
+        try:
+            async with engine.begin() as conn:
+                for statement in SEED:
+                    await conn.execute(text(statement))
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+                await conn.execute(text("VACUUM ANALYZE"))
+        finally:
+            await engine.dispose()
+
+    asyncio.run(admin(f'DROP DATABASE IF EXISTS "{name}"'))
+    asyncio.run(admin(f'CREATE DATABASE "{name}"'))
+    try:
+        subprocess.run(
+            [sys.executable, 'migrations.py'], cwd=ROOT_DIR, env={**os.environ, 'DATABASE_NAME': name},
+            check=True, capture_output=True
+        )
+        asyncio.run(seed())
+        yield dsn
+    finally:
+        asyncio.run(admin(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+
+
+async def explain(conn, statement):
+    # Оператор компилируется диалектом PostgreSQL движка, параметры передаются так же, как при выполнении
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    result = await conn.exec_driver_sql(f"EXPLAIN {compiled}", tuple(params[name] for name in compiled.positiontup))
+    return '\n'.join(result.scalars().all())
+
+
+async def query_plans(dsn, call):
+    engine = create_engine(dsn)
+    try:
+        async with RecordingDatabase(engine) as db:
+            await call(db)
+        async with engine.connect() as conn:
+            plans = [await explain(conn, statement) for statement in db.statements]
+            parents = dict((await conn.execute(text(
+                "SELECT child.relname, parent.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = inhrelid JOIN pg_class parent ON parent.oid = inhparent "
+                "WHERE child.relkind = 'i'"
+            ))).all())
+        return plans, parents
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.parametrize('name', list(CASES))
+def test_router_query_uses_indexes(plans_database, name):
+    call, expected = CASES[name]
+    plans, parents = asyncio.run(query_plans(plans_database, call))
+    plan = '\n'.join(plans)
+    indexes = re.findall(r'Index (?:Only )?Scan (?:Backward )?(?:using|on) (\S+)', plan)
+    used = {parents.get(index, index) for index in indexes}
+    assert 'Seq Scan' not in plan, plan
+    assert expected <= used, plan
@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import pytest
+
+from paths import ROOT_DIR, use_modules
+
+use_modules(ROOT_DIR)
+
+from sqlalchemy import text
+
+from databases import AsyncDatabase, WebhookEvent, create_engine
+from migrations import migrate
+from parser_yougile import WebhookWorker
+from workspaces import Workspace
+
+# Тесты пишут в базу из DATABASE_*, поэтому без неё пропускаются
+pytestmark = pytest.mark.skipif(not os.getenv('DATABASE_NAME'), reason='DATABASE_NAME is not set')
+
+EMAIL = 'webhook-test@example.com'
+USER_ID = 'webhook-test-user'
+
+
+async def cleanup(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM webhook_events WHERE key = :key"), {'key': USER_ID})
+        await conn.execute(text("DELETE FROM change_events WHERE key = :email"), {'email': EMAIL})
+        await conn.execute(text("DELETE FROM sync_row_hashes WHERE key IN (:email, :user)"),
+                           {'email': EMAIL, 'user': f'test:{USER_ID}'})
+        await conn.execute(text("DELETE FROM service_identities WHERE employee_email = :email"), {'email': EMAIL})
+        await conn.execute(text("DELETE FROM employees WHERE email = :email"), {'email': EMAIL})
+
+
+async def delete_employee_by_webhook():
+    engine = create_engine()
+    workspace = Workspace(name='test', api_key='test', scoped=True)
+    try:
+        await migrate(engine)
+        await cleanup(engine)
+        async with AsyncDatabase(engine) as db:
+            await db.upsert_employees([{'email': EMAIL, 'first_name': 'Test'}])
+            await db.upsert_service_identities([{
+                'service_user_id': workspace.user_key(USER_ID),
+                'employee_email': EMAIL,
+                'service_name': workspace.service_name,
+            }])
+            await db.upsert_row_hashes('test/employees', {EMAIL: b'hash'})
+            await db.upsert_row_hashes('test/service_identities', {workspace.user_key(USER_ID): b'hash'})
+            db.session.add(WebhookEvent(
+                entity='employees', action='deleted', key=USER_ID, payload={'id': USER_ID}, workspace='test'
+            ))
+            await db.session.commit()
+
+        await WebhookWorker(engine, [workspace]).apply_batch()
+
+        async with engine.connect() as conn:
+            hashes = (await conn.execute(text(
+                "SELECT entity FROM sync_row_hashes WHERE key IN (:email, :user)"
+            ), {'email': EMAIL, 'user': workspace.user_key(USER_ID)})).scalars().all()
+            events = (await conn.execute(text(
+                "SELECT key FROM change_events WHERE entity = 'employees' AND action = 'deleted' AND key = :email"
+            ), {'email': EMAIL})).scalars().all()
+        return hashes, events
+    finally:
+        await cleanup(engine)
+        await engine.dispose()
+
+
+def test_employee_deletion_clears_hash_keyed_by_email():
+    hashes, events = asyncio.run(delete_employee_by_webhook())
+    assert hashes == []
+    assert events == [EMAIL]
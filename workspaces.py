@@ -0,0 +1,94 @@
+import os
+import re
+
+import yaml
+from dotenv import load_dotenv, find_dotenv
+
+from yougile import YOUGILE_API_KEY, YOUGILE_BASE_URL, YOUGILE_MAX_CONCURRENCY, YOUGILE_RATE_LIMIT, YouGile
+
+load_dotenv(find_dotenv())
+
+# Файл со списком пространств YouGile; без него синхронизируется одно пространство из YOUGILE_API_KEY
+YOUGILE_WORKSPACES_FILE = os.getenv('YOUGILE_WORKSPACES_FILE')
+SERVICE_NAME = 'yougile'
+
+NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]*$')
+
+
+class Workspace:
+    # Пространство (компания) YouGile со своим ключом, лимитом запросов и числом параллельных запросов.
+    # У scoped-пространства идентификаторы пользователей, service_name и состояние синхронизации
+    # получают его имя, поэтому один и тот же пользователь YouGile в разных компаниях не совпадает.
+    # Несколько пространств может быть только одно не scoped: это данные, которые раньше писал
+    # парсер с одним YOUGILE_API_KEY.
+    __slots__ = ('name', 'api_key', 'base_url', 'rate_limit', 'max_concurrency', 'interval_minutes', 'scoped')
+
+    def __init__(self, name='default', api_key=YOUGILE_API_KEY, base_url=YOUGILE_BASE_URL,
+                 rate_limit=YOUGILE_RATE_LIMIT, max_concurrency=YOUGILE_MAX_CONCURRENCY,
+                 interval_minutes=None, scoped=False):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.rate_limit = rate_limit
+        self.max_concurrency = max_concurrency
+        self.interval_minutes = interval_minutes
+        self.scoped = scoped
+
+    @property
+    def service_name(self):
+        return f'{SERVICE_NAME}:{self.name}' if self.scoped else SERVICE_NAME
+
+    @property
+    def scope(self):
+        # Префикс сущностей в sync_row_hashes и sync_watermarks
+        return self.name if self.scoped else ''
+
+    def user_key(self, user_id):
+        if user_id is None or not self.scoped:
+            return user_id
+        return f'{self.name}:{user_id}'
+
+    def client(self):
+        return YouGile(
+            api_key=self.api_key, base_url=self.base_url,
+            max_concurrency=self.max_concurrency, rate_limit=self.rate_limit
+        )
+
+
+DEFAULT_WORKSPACE = Workspace()
+
+
+def workspace_from_config(entry):
+    name = str(entry.get('name', ''))
+    if not NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid workspace name {name!r}: use lowercase letters, digits, '-' and '_'")
+    # Ключ лучше держать в переменной окружения, а в файле указывать только её имя
+    api_key = entry.get('api_key') or os.getenv(entry.get('api_key_env', ''))
+    if not api_key:
+        raise ValueError(f"Workspace {name}: api_key or api_key_env with a non-empty value is required")
+    interval = entry.get('interval_minutes')
+    return Workspace(
+        name=name,
+        api_key=api_key,
+        base_url=entry.get('base_url', YOUGILE_BASE_URL),
+        rate_limit=float(entry.get('rate_limit', YOUGILE_RATE_LIMIT)),
+        max_concurrency=int(entry.get('max_concurrency', YOUGILE_MAX_CONCURRENCY)),
+        interval_minutes=float(interval) if interval is not None else None,
+        scoped=bool(entry.get('scoped', True)),
+    )
+
+
+def load_workspaces(path=YOUGILE_WORKSPACES_FILE):
+    if not path:
+        return [DEFAULT_WORKSPACE]
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    workspaces = [workspace_from_config(entry) for entry in config.get('workspaces') or []]
+    if not workspaces:
+        raise ValueError(f"No workspaces in {path}")
+    names = [workspace.name for workspace in workspaces]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate workspace names in {path}")
+    if sum(not workspace.scoped for workspace in workspaces) > 1:
+        raise ValueError(f"Only one workspace in {path} can have scoped: false")
+    return workspaces
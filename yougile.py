@@ -1,68 +1,271 @@
 import asyncio
+import codecs
 import functools
+import json
 import os
+import random
+import time
 import httpx
 
 from dotenv import load_dotenv, find_dotenv
 
+from metrics import YOUGILE_ERRORS, YOUGILE_REQUEST_DURATION
+
 load_dotenv(find_dotenv())
 
 YOUGILE_API_KEY = os.getenv('YOUGILE_API_KEY')
+YOUGILE_BASE_URL = os.getenv('YOUGILE_BASE_URL', 'https://ru.yougile.com/api-v2')
+# Не больше 50 запросов в минуту на компанию по документации YouGile
+YOUGILE_RATE_LIMIT = float(os.getenv('YOUGILE_RATE_LIMIT', 50))
+YOUGILE_MAX_CONCURRENCY = int(os.getenv('YOUGILE_MAX_CONCURRENCY', 4))
+YOUGILE_PAGE_SIZE = 1000
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+JSON_WHITESPACE = ' \t\r\n'
+
+
+class JsonStream:
+    # Читает JSON из потока байтов по частям: значения разбираются по одному, а уже
+    # разобранная часть буфера отбрасывается
+    def __init__(self, chunks):
+        self.chunks = chunks.__aiter__()
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    async def _read(self):
+        if self.eof:
+            raise ValueError('Unexpected end of JSON response')
+        try:
+            text = self.decoder.decode(await self.chunks.__anext__())
+        except StopAsyncIteration:
+            self.eof = True
+            text = self.decoder.decode(b'', final=True)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+
+    async def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in JSON_WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            await self._read()
+
+    async def take(self, expected):
+        char = await self.peek()
+        if char not in expected:
+            raise ValueError(f'Unexpected {char!r} in JSON response, expected one of {expected!r}')
+        self.pos += 1
+        return char
+
+    async def value(self):
+        await self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                await self._read()
+                continue
+            # Число в конце буфера могло быть обрезано границей чанка
+            if end == len(self.buffer) and not self.eof:
+                await self._read()
+                continue
+            self.pos = end
+            return value
+
+
+async def decode_page(chunks, record=None):
+    # Страница {"paging": {...}, "content": [...]} разбирается по мере загрузки. Элементы content
+    # сразу сворачиваются в record, так что полные словари YouGile не живут дольше одной записи.
+    stream = JsonStream(chunks)
+    page = {}
+    await stream.take('{')
+    if await stream.peek() == '}':
+        return page
+    while True:
+        key = await stream.value()
+        await stream.take(':')
+        if key == 'content' and await stream.peek() == '[':
+            await stream.take('[')
+            content = page['content'] = []
+            if await stream.peek() == ']':
+                await stream.take(']')
+            else:
+                while True:
+                    item = await stream.value()
+                    content.append(record(item) if record is not None else item)
+                    if await stream.take(',]') == ']':
+                        break
+        else:
+            page[key] = await stream.value()
+        if await stream.take(',}') == '}':
+            return page
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 
 # decorator for async functions to retry request
+def retry_request(attempts=5, backoff=1.0, max_backoff=60.0):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+                    retryable = isinstance(exc, httpx.TransportError) or exc.response.status_code in RETRY_STATUSES
+                    if not retryable or attempt == attempts:
+                        raise
+                    delay = min(max_backoff, backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                    if isinstance(exc, httpx.HTTPStatusError):
+                        retry_after = exc.response.headers.get('Retry-After', '')
+                        if retry_after.isdigit():
+                            delay = max(delay, float(retry_after))
+                    print(f"YouGile request failed ({exc}), retry {attempt}/{attempts - 1} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        return wrapper
+    return decorator
+
 
 class YouGile:
-    def __init__(self):
+    def __init__(self, api_key=YOUGILE_API_KEY, base_url=YOUGILE_BASE_URL,
+                 max_concurrency=YOUGILE_MAX_CONCURRENCY, rate_limit=YOUGILE_RATE_LIMIT,
+                 page_size=YOUGILE_PAGE_SIZE):
         self.headers = {
             'Accept': 'application/json',
-            'Authorization': f'Bearer {YOUGILE_API_KEY}'
+            'Authorization': f'Bearer {api_key}'
         }
-    # @retry_request()
-    async def get_employees(self, offset=0):
-        url = f"https://ru.yougile.com/api-v2/users?limit=1000&offset={offset}"
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-            except httpx.HTTPStatusError as exc:
-                raise Exception(f"HTTP error occurred: {exc}")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                response.raise_for_status()
-    # @retry_request()
-    async def get_tasks(self, offset=0):
-        url = f"https://ru.yougile.com/api-v2/tasks?limit=1000&offset={offset}"
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-            except httpx.HTTPStatusError as exc:
-                raise Exception(f"HTTP error occurred: {exc}")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                response.raise_for_status()
-    # @retry_request
-    async def get_projects(self, offset=0):
-        url = f"https://ru.yougile.com/api-v2/projects?limit=1000&offset={offset}"
-        async with httpx.AsyncClient() as client:
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=self.headers,
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+        # rate_limit задаётся в запросах в минуту
+        self.rate_limiter = TokenBucket(rate_limit / 60.0, capacity=max_concurrency)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        await self.client.aclose()
+
+    @retry_request()
+    async def get_page(self, path, offset=0, record=None):
+        # record преобразует каждый элемент content сразу после разбора
+        async with self._semaphore:
+            await self.rate_limiter.acquire()
+            started = time.perf_counter()
+            params = {'limit': self.page_size, 'offset': offset}
             try:
-                response = await client.get(url, headers=self.headers)
-            except httpx.HTTPStatusError as exc:
-                raise Exception(f"HTTP error occurred: {exc}")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                response.raise_for_status()
+                async with self.client.stream('GET', path, params=params) as response:
+                    if response.is_error:
+                        await response.aread()
+                        page = None
+                    else:
+                        page = await decode_page(response.aiter_bytes(), record)
+            except httpx.TransportError as exc:
+                YOUGILE_ERRORS.labels(path, type(exc).__name__).inc()
+                raise
+            YOUGILE_REQUEST_DURATION.labels(path, response.status_code).observe(time.perf_counter() - started)
+            if response.is_error:
+                YOUGILE_ERRORS.labels(path, response.status_code).inc()
+            response.raise_for_status()
+            return page
+
+    async def iter_pages(self, path, record=None):
+        # Первая страница запрашивается отдельно, чтобы не тратить лимит на маленьких пространствах
+        page = await self.get_page(path, 0, record)
+        yield page
+        if not page.get('paging', {}).get('next'):
+            return
+
+        # Дальше страницы запрашиваются окном из max_concurrency смещений; страницы за концом
+        # списка приходят пустыми и отбрасываются
+        offset = self.page_size
+        last_page = False
+        pending = set()
+        try:
+            while True:
+                while not last_page and len(pending) < self.max_concurrency:
+                    pending.add(asyncio.create_task(self.get_page(path, offset, record)))
+                    offset += self.page_size
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page = task.result()
+                    if not page.get('paging', {}).get('next'):
+                        last_page = True
+                    if page.get('content'):
+                        yield page
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def iter_employees(self, record=None):
+        return self.iter_pages('users', record)
+
+    def iter_tasks(self, record=None):
+        return self.iter_pages('tasks', record)
+
+    def iter_projects(self, record=None):
+        return self.iter_pages('projects', record)
+
+    async def _get_all(self, pages):
+        content = []
+        async for page in pages:
+            content.extend(page.get('content', []))
+        return {'content': content}
+
+    async def get_employees(self):
+        return await self._get_all(self.iter_employees())
+
+    async def get_tasks(self):
+        return await self._get_all(self.iter_tasks())
+
+    async def get_projects(self):
+        return await self._get_all(self.iter_projects())
 
 
 async def main():
-    yougile = YouGile()
-    employees = await yougile.get_employees()
-    print(employees)
-    tasks = await yougile.get_tasks()
-    print(tasks)
-    projects = await yougile.get_projects()
-    print(projects)
+    async with YouGile() as yougile:
+        employees = await yougile.get_employees()
+        print(employees)
+        tasks = await yougile.get_tasks()
+        print(tasks)
+        projects = await yougile.get_projects()
+        print(projects)
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())